@@ -0,0 +1,171 @@
+"""Admission control in front of the LLM backends.
+
+Each model gets a gate that lets at most `llm_concurrency_per_model` calls
+run at once. Callers beyond that wait in per-user queues that are served
+round-robin, so one user with many requests in flight can't starve the
+rest. When queues are full, requests are turned away immediately with 429
+(this user has too many waiting) or 503 (the model is saturated), both
+carrying a Retry-After estimate.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from .config import settings
+
+
+class ModelGate:
+    def __init__(self, capacity: int, max_queue: int, max_queue_per_user: int, queue_timeout: float):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        # user id -> waiting futures; the user at the front is served next
+        self._waiters = OrderedDict()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        # Moving average of call duration, used for Retry-After
+        self.service_seconds = 5.0
+
+    def retry_after(self) -> int:
+        waves = (self.queued + self.capacity) / self.capacity
+        return max(1, math.ceil(waves * self.service_seconds))
+
+    def _reject(self, status_code: int, detail: str) -> HTTPException:
+        self.rejected += 1
+        return HTTPException(status_code=status_code, detail=detail,
+                             headers={"Retry-After": str(self.retry_after())})
+
+    def check(self, user_id: int) -> None:
+        """Raise 429/503 now if a call for `user_id` would have to queue past the limits."""
+        if self.in_flight < self.capacity and not self.queued:
+            return
+        if len(self._waiters.get(user_id, ())) >= self.max_queue_per_user:
+            raise self._reject(429, "Too many pending requests for this model")
+        if self.queued >= self.max_queue:
+            raise self._reject(503, "Model is busy, try again later")
+
+    async def acquire(self, user_id: int, bounded: bool = True) -> None:
+        """Wait for a slot. Unbounded callers (background jobs) skip the queue limits."""
+        if bounded:
+            self.check(user_id)
+        if self.in_flight < self.capacity and not self.queued:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user_id, deque()).append(waiter)
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout if bounded else None)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we gave up; hand the slot to the next waiter
+                self.release()
+            else:
+                self._discard(user_id, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise self._reject(503, "Timed out waiting for the model") from None
+            raise
+
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def _discard(self, user_id: int, waiter) -> None:
+        queue = self._waiters.get(user_id)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self.queued -= 1
+            if not queue:
+                del self._waiters[user_id]
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.capacity:
+            user_id, queue = next(iter(self._waiters.items()))
+            waiter = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self._waiters.move_to_end(user_id)
+            else:
+                del self._waiters[user_id]
+            if not waiter.done():
+                waiter.set_result(None)
+                self.in_flight += 1
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, bounded: bool = True):
+        await self.acquire(user_id, bounded)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.service_seconds = 0.8 * self.service_seconds + 0.2 * (time.monotonic() - started)
+            self.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "queue_wait_seconds_avg": self.wait_seconds_total / self.admitted if self.admitted else 0.0,
+            "queue_wait_seconds_max": self.wait_seconds_max,
+            "service_seconds_avg": self.service_seconds,
+        }
+
+
+class GatedLLM:
+    """A chat model client whose calls go through a model gate on behalf of one user."""
+
+    def __init__(self, llm, gate: ModelGate, user_id: int, bounded: bool = True):
+        self.llm = llm
+        self.gate = gate
+        self.user_id = user_id
+        self.bounded = bounded
+
+    def check(self) -> None:
+        if self.bounded:
+            self.gate.check(self.user_id)
+
+    async def ainvoke(self, messages, **kwargs):
+        async with self.gate.slot(self.user_id, self.bounded):
+            return await self.llm.ainvoke(messages, **kwargs)
+
+    async def astream(self, messages, **kwargs):
+        async with self.gate.slot(self.user_id, self.bounded):
+            async for chunk in self.llm.astream(messages, **kwargs):
+                yield chunk
+
+
+_gates = {}
+
+
+def gate(model: str) -> ModelGate:
+    if model not in _gates:
+        _gates[model] = ModelGate(
+            capacity=settings.llm_concurrency_per_model,
+            max_queue=settings.llm_max_queue_per_model,
+            max_queue_per_user=settings.llm_max_queue_per_user,
+            queue_timeout=settings.llm_queue_timeout,
+        )
+    return _gates[model]
+
+
+def snapshot() -> dict:
+    return {model: g.snapshot() for model, g in _gates.items()}
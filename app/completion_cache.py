@@ -0,0 +1,196 @@
+"""Cache of LLM completions keyed on exactly what was asked.
+
+The key is a SHA-256 over the model, its sampling parameters and the
+message list (with whitespace normalized), so a templated upload prompt or
+a regenerated turn that matches an earlier call is answered without going
+to the model. Entries live in an in-process LRU bounded by bytes and, with
+`completion_cache_store = "database"`, also in the completion_cache table
+so they survive restarts and are shared between workers.
+
+Off unless `completion_cache_enabled` is set.
+"""
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from langchain_core.messages import AIMessage, AIMessageChunk
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from . import models
+from .config import settings
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(content) -> str:
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True)
+    return "\n".join(line.rstrip() for line in content.strip().splitlines())
+
+
+def cache_key(model: str, params: dict, messages) -> str:
+    payload = {
+        "model": model,
+        "params": params,
+        "messages": [[message.type, normalize(message.content)] for message in messages],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class MemoryTier:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> content
+
+    def get(self, key: str) -> str | None:
+        content = self._entries.get(key)
+        if content is not None:
+            self._entries.move_to_end(key)
+        return content
+
+    def put(self, key: str, content: str):
+        if key in self._entries:
+            self.size -= len(key) + len(self._entries.pop(key).encode())
+        cost = len(key) + len(content.encode())
+        if cost > self.max_bytes:
+            return
+        self._entries[key] = content
+        self.size += cost
+        while self.size > self.max_bytes:
+            old_key, old_content = self._entries.popitem(last=False)
+            self.size -= len(old_key) + len(old_content.encode())
+
+
+class DatabaseTier:
+    def __init__(self, ttl_hours: float):
+        self.ttl = timedelta(hours=ttl_hours)
+
+    async def get(self, key: str) -> str | None:
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(models.CachedCompletion.content).where(
+                models.CachedCompletion.key == key,
+                models.CachedCompletion.created_at > datetime.now(timezone.utc) - self.ttl
+            ))
+
+    async def put(self, key: str, model: str, content: str):
+        async with AsyncSessionLocal() as db:
+            # Expired entries are pruned as new ones are written
+            await db.execute(delete(models.CachedCompletion).where(
+                models.CachedCompletion.created_at <= datetime.now(timezone.utc) - self.ttl
+            ))
+            # Workers that finish the same prompt at once both write; the last one wins
+            insert_entry = insert(models.CachedCompletion).values(key=key, model=model, content=content)
+            await db.execute(insert_entry.on_conflict_do_update(
+                index_elements=[models.CachedCompletion.key],
+                set_={"model": model, "content": content, "created_at": func.now()},
+            ))
+            await db.commit()
+
+
+class CompletionCache:
+    def __init__(self, memory: MemoryTier, database: DatabaseTier | None = None):
+        self.memory = memory
+        self.database = database
+        self.hits = 0
+        self.database_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    async def get(self, key: str) -> str | None:
+        content = self.memory.get(key)
+        if content is None and self.database is not None:
+            content = await self.database.get(key)
+            if content is not None:
+                self.database_hits += 1
+                self.memory.put(key, content)
+        if content is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return content
+
+    async def put(self, key: str, model: str, content: str):
+        self.memory.put(key, content)
+        if self.database is not None:
+            # The reply is already generated; failing to cache it mustn't fail the request
+            try:
+                await self.database.put(key, model, content)
+            except Exception:
+                logger.exception("Writing completion %s to the database cache failed", key)
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.completion_cache_enabled,
+            "hits": self.hits,
+            "database_hits": self.database_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "memory_bytes": self.memory.size,
+            "memory_entries": len(self.memory._entries),
+        }
+
+
+class CachedLLM:
+    """Wraps a (gated) chat model client so repeated prompts are served from the cache.
+
+    With `fresh` set the cache is not read, but the new completion still
+    replaces the cached one.
+    """
+
+    def __init__(self, llm, model: str, params: dict, fresh: bool = False):
+        self.llm = llm
+        self.model = model
+        self.params = params
+        self.fresh = fresh
+
+    def check(self) -> None:
+        self.llm.check()
+
+    async def _lookup(self, key: str) -> str | None:
+        if self.fresh:
+            cache.bypassed += 1
+            return None
+        return await cache.get(key)
+
+    async def ainvoke(self, messages, **kwargs):
+        key = cache_key(self.model, self.params, messages)
+        content = await self._lookup(key)
+        if content is not None:
+            return AIMessage(content=content)
+
+        response = await self.llm.ainvoke(messages, **kwargs)
+        if response.content:
+            await cache.put(key, self.model, response.content)
+        return response
+
+    async def astream(self, messages, **kwargs):
+        key = cache_key(self.model, self.params, messages)
+        content = await self._lookup(key)
+        if content is not None:
+            yield AIMessageChunk(content=content)
+            return
+
+        parts = []
+        async for chunk in self.llm.astream(messages, **kwargs):
+            parts.append(chunk.content)
+            yield chunk
+        # Only a stream that ran to the end is cached
+        if "".join(parts):
+            await cache.put(key, self.model, "".join(parts))
+
+
+def build_cache(name: str) -> CompletionCache:
+    memory = MemoryTier(settings.completion_cache_max_bytes)
+    if name == "memory":
+        return CompletionCache(memory)
+    if name == "database":
+        return CompletionCache(memory, DatabaseTier(settings.completion_cache_ttl_hours))
+    raise ValueError(f"Unknown completion cache store '{name}'")
+
+
+cache = build_cache(settings.completion_cache_store)
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -6,12 +7,130 @@ class Settings(BaseSettings):
     database_password: str
     database_name: str
     database_username: str
+
+    # Connection pool per worker; timeouts are in milliseconds and apply to every session
+    database_pool_size: int = 10
+    database_max_overflow: int = 10
+    database_pool_timeout: float = 10.0
+    database_pool_recycle: int = 1800
+    database_pool_pre_ping: bool = True
+    database_statement_timeout_ms: int = 15000
+    database_idle_in_transaction_timeout_ms: int = 30000
+    # Connections all workers together may open to the primary: the server's
+    # max_connections less what other clients need. Each worker can open up to
+    # database_pool_size + database_max_overflow.
+    database_max_connections: int = 100
+
+    # Optional read replicas (postgresql://... URLs, a JSON list in the environment)
+    # for read-only endpoints. A replica is skipped while it fails its health
+    # check or lags more than database_replica_max_lag_seconds, and a user's
+    # reads go to the primary for read_your_writes_seconds after they write.
+    database_replica_urls: list[str] = []
+    database_replica_check_seconds: float = 5.0
+    database_replica_max_lag_seconds: float = 10.0
+    read_your_writes_seconds: float = 5.0
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
     refresh_token_expire_days: int
 
+    # python -m app.start_server; 0 workers means one per available CPU, as many as
+    # the connection budget below allows
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    server_workers: int = 0
+    server_loop: str = "uvloop"
+    server_http: str = "httptools"
+    server_graceful_timeout: int = 60
+    server_keep_alive: int = 5
+    server_forwarded_allow_ips: str = "127.0.0.1"
+
+    # bcrypt cost and the size of the worker-process pool that computes it
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 64
+
+    # "database" (shared by all workers) or "memory" (single worker only)
+    refresh_token_store: str = "database"
+    refresh_token_store_max_size: int = 100000
+
+    # Uploaded files, stored content-addressed under upload_dir
+    upload_dir: str = "uploads"
+    upload_max_bytes: int = 25 * 1024 * 1024
+    upload_chunk_size: int = 1024 * 1024
+
+    # NDJSON export/import; rows per fetch or insert, and the decompressed import size caps
+    bulk_batch_size: int = 500
+    import_max_bytes: int = 256 * 1024 * 1024
+    import_max_line_bytes: int = 16 * 1024 * 1024
+
+    # Retrieval over uploaded files; "hash" is a local stand-in embedding
+    embedding_provider: str = "ollama"
+    embedding_model: str = "nomic-embed-text"
+    # Kept outside upload_dir: indexes hold chunk texts and must never be served as files
+    index_dir: str = "indexes"
+    index_cache_size: int = 256
+    ingest_chunk_size: int = 1000
+    ingest_chunk_overlap: int = 150
+    retrieval_top_k: int = 4
+    retrieval_min_score: float = 0.2
+
+    # In-process cache of authenticated users, keyed by the token's user id
+    user_cache_size: int = 10000
+    user_cache_ttl_seconds: int = 60
+
+    # LLM providers; llm_models maps each model a client may ask for to its provider
+    openai_api_key: Optional[str] = None
+    openai_base_url: Optional[str] = None
+    ollama_base_url: Optional[str] = None
+    llm_models: dict[str, str] = {"gpt-4o-mini": "openai", "llama3:8b": "ollama"}
+    llm_default_model: str = "llama3:8b"
+    llm_send_model: str = "gpt-4o-mini"
+    llm_temperature: float = 0.7
+    llm_timeout: float = 120.0
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20
+
+    # Admission control per model: concurrent calls, and how many may wait behind them
+    llm_concurrency_per_model: int = 2
+    llm_max_queue_per_model: int = 32
+    llm_max_queue_per_user: int = 4
+    llm_queue_timeout: float = 60.0
+
+    # Opt-in cache of completions for repeated prompts; "database" adds a shared tier
+    completion_cache_enabled: bool = False
+    completion_cache_store: str = "memory"
+    completion_cache_max_bytes: int = 32 * 1024 * 1024
+    completion_cache_ttl_hours: float = 24 * 7
+
+    # Conversation context sent with each turn, measured with tiktoken
+    context_max_tokens: int = 3000
+    context_encoding: str = "cl100k_base"
+    # Summary calls made per turn when older messages overflow the window; a
+    # long backlog is folded over several turns instead of all at once
+    context_summary_batches_per_turn: int = 2
+
+    # Background LLM jobs (?async=1); how many run at once against each model
+    job_concurrency_per_model: int = 2
+    job_wait_max_seconds: float = 30.0
+    # A job whose worker hasn't renewed its lease for this long is marked failed
+    job_lease_seconds: float = 60.0
+
+    # WebSocket chat channel (/ws): heartbeat interval, per-connection send buffer
+    # (in frames), concurrent requests per connection, and messages per sync frame
+    ws_heartbeat_seconds: float = 20.0
+    ws_send_queue_size: int = 256
+    ws_max_inflight: int = 4
+    ws_sync_limit: int = 200
+
+    # Load LLM providers, the tokenizer and embeddings at startup rather than on
+    # first use; slower boot, no slow first requests
+    warm_up: bool = False
+
+    # Prometheus metrics at /metrics; when off nothing is recorded
+    metrics_enabled: bool = True
+
     class Config:
         env_file = ".env"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
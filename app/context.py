@@ -0,0 +1,122 @@
+"""Token-budgeted conversation context for the LLM.
+
+Only the most recent messages that fit `settings.context_max_tokens` are sent
+verbatim. Older turns are folded into a per-chat rolling summary stored on the
+Chat row, so each message is summarized once instead of being re-sent on every
+turn.
+"""
+from functools import lru_cache
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from sqlalchemy import select
+from . import models
+from .config import settings
+
+# Rough per-message framing overhead of the chat formats
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an "
+    "assistant. Update the summary with the new turns, keeping facts, names, "
+    "decisions and open questions. Reply with the updated summary only."
+)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(settings.context_encoding)
+    except Exception:
+        # tiktoken fetches encodings on first use; offline hosts fall back
+        # to a ~4 characters per token estimate
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return len(text or "") // 4 + 1 + MESSAGE_OVERHEAD_TOKENS
+    return len(encoding.encode(text or "", disallowed_special=())) + MESSAGE_OVERHEAD_TOKENS
+
+
+def to_langchain(sender: str, content: str):
+    return HumanMessage(content) if sender == "user" else AIMessage(content)
+
+
+async def summarize(llm, summary: str | None, turns) -> str:
+    transcript = "\n".join(f"{msg.sender}: {msg.content}" for msg in turns)
+    prompt = [
+        SystemMessage(SUMMARY_PROMPT),
+        HumanMessage(f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"),
+    ]
+    return (await llm.ainvoke(prompt)).content
+
+
+async def fold_into_summary(llm, chat: models.Chat, overflow, max_batches: int | None = None):
+    """Fold `overflow` (oldest first) into chat.summary, one budget-sized batch at a time.
+
+    At most `max_batches` summary calls are made; messages past them stay
+    unsummarized for a later turn to fold.
+    """
+    batches, batch, batch_tokens = [], [], 0
+    for msg in overflow:
+        tokens = count_tokens(msg.content)
+        if batch and batch_tokens + tokens > settings.context_max_tokens:
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(msg)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+
+    for batch in batches[:max_batches]:
+        chat.summary = await summarize(llm, chat.summary, batch)
+        chat.summary_message_id = batch[-1].id
+
+
+async def build_context(db, chat: models.Chat, new_message: str, llm):
+    """Return (history, window) for the next turn of `chat`.
+
+    `history` is the LangChain message list to send: the rolling summary, the
+    recent messages that fit the token budget, then `new_message`. `window`
+    holds the rows sent verbatim. Messages pushed out of the window are folded
+    into the summary; the caller commits the updated chat.
+
+    Each turn folds at most `settings.context_summary_batches_per_turn`
+    batches, so a long chat's first turn isn't held up by summarizing its
+    whole history in sequence. Until the backlog is caught up, the messages
+    between the summary and the window are left out of the context.
+
+    The session's transaction is committed before any summary is generated,
+    so no connection is held while the LLM runs.
+    """
+    budget = settings.context_max_tokens - count_tokens(new_message)
+    if chat.summary:
+        budget -= count_tokens(chat.summary)
+
+    query = select(models.Message.id, models.Message.sender, models.Message.content).where(
+        models.Message.chat_id == chat.id
+    ).order_by(models.Message.created_at.desc(), models.Message.id.desc())
+    if chat.summary_message_id is not None:
+        query = query.where(models.Message.id > chat.summary_message_id)
+
+    window, overflow = [], []
+    for msg in await db.execute(query):
+        tokens = count_tokens(msg.content)
+        if overflow or tokens > budget:
+            overflow.append(msg)
+        else:
+            window.append(msg)
+            budget -= tokens
+
+    if overflow:
+        await db.commit()
+        await fold_into_summary(llm, chat, overflow[::-1], settings.context_summary_batches_per_turn)
+
+    window.reverse()
+    history = []
+    if chat.summary:
+        history.append(SystemMessage(f"Summary of the earlier conversation:\n{chat.summary}"))
+    history += [to_langchain(msg.sender, msg.content) for msg in window]
+    history.append(HumanMessage(new_message))
+    return history, window
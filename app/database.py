@@ -1,19 +1,44 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from .config import settings
 
 
 DATABASE_URL = f'postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}'
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+# Sync engine for scripts; the app itself only uses async_engine
+engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+
+def create_app_engine(url: str, pooled: bool = True):
+    """An async engine for `url` (postgresql://...) with the configured pool and timeouts.
+
+    Unpooled engines open a fresh connection per use, for occasional
+    checks that mustn't wait behind request traffic for a pooled one.
+    """
+    pool_options = dict(
+        pool_size=settings.database_pool_size,
+        max_overflow=settings.database_max_overflow,
+        pool_timeout=settings.database_pool_timeout,
+        pool_recycle=settings.database_pool_recycle,
+        pool_pre_ping=settings.database_pool_pre_ping,
+    ) if pooled else dict(poolclass=NullPool)
+    return create_async_engine(
+        url.replace('postgresql://', 'postgresql+asyncpg://', 1),
+        **pool_options,
+        # Server-side limits, so a runaway query or a session left open in a
+        # transaction can't hold a pooled connection indefinitely
+        connect_args={"server_settings": {
+            "statement_timeout": str(settings.database_statement_timeout_ms),
+            "idle_in_transaction_session_timeout": str(settings.database_idle_in_transaction_timeout_ms),
+        }},
+    )
+
+async_engine = create_app_engine(DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""Embedding model used to index uploaded files.
+
+`settings.embedding_provider` selects "ollama", "openai" or "hash". The
+"hash" provider is a dependency-free local stand-in (feature hashing of
+word tokens) for tests and offline development; its vectors carry lexical
+overlap only, not meaning.
+"""
+import hashlib
+import re
+from functools import lru_cache
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .config import settings
+
+_WORD = re.compile(r"\w+")
+
+
+class HashEmbeddings(Embeddings):
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vector[h % self.dim] += 1.0 if (h >> 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> Embeddings:
+    provider = settings.embedding_provider
+    if provider == "ollama":
+        from langchain_ollama import OllamaEmbeddings
+        return OllamaEmbeddings(model=settings.embedding_model, base_url=settings.ollama_base_url)
+    if provider == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(model=settings.embedding_model, api_key=settings.openai_api_key,
+                                base_url=settings.openai_base_url)
+    if provider == "hash":
+        return HashEmbeddings()
+    raise ValueError(f"Unknown embedding provider '{provider}'")
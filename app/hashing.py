@@ -0,0 +1,21 @@
+"""bcrypt work executed inside the password-hashing worker processes.
+
+Kept free of app imports so spawned workers start quickly; utils.py owns
+the pool and is what the rest of the app calls.
+"""
+from functools import lru_cache
+from passlib.context import CryptContext
+
+
+@lru_cache(maxsize=None)
+def _context(rounds: int):
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=rounds)
+
+
+def hash_password(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    # Verification reads the cost from the hash itself
+    return _context(4).verify(plain_password, hashed_password)
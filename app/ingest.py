@@ -0,0 +1,76 @@
+"""Turn uploaded files into retrievable chunks.
+
+Uploads are decoded to text, split with langchain-text-splitters, embedded
+and appended to the chat's vector index. Chat turns then retrieve only the
+chunks relevant to the new message instead of sending whole documents.
+"""
+import codecs
+from functools import lru_cache
+import anyio
+from langchain_core.messages import SystemMessage
+from . import vectorstore
+from .config import settings
+from .embeddings import get_embeddings
+
+
+@lru_cache(maxsize=1)
+def _splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=settings.ingest_chunk_size,
+        chunk_overlap=settings.ingest_chunk_overlap,
+    )
+
+
+def extract_text(path: str) -> str | None:
+    """Decode a text-like file; None for binary formats we can't read."""
+    with open(path, "rb") as f:
+        data = f.read(settings.upload_max_bytes)
+    # A BOM settles the encoding; UTF-16 text is full of NULs, so check it first
+    if data.startswith(codecs.BOM_UTF8):
+        encodings = ("utf-8-sig",)
+    elif data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encodings = ("utf-16",)
+    elif b"\x00" in data[:8192]:
+        return None
+    else:
+        encodings = ("utf-8", "latin-1")
+    for encoding in encodings:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+async def ingest_file(chat_id: int, stored) -> list[str]:
+    """Index an uploaded file for `chat_id` and return its chunks."""
+    text = await anyio.to_thread.run_sync(extract_text, stored.path)
+    if not text or not text.strip():
+        return []
+
+    chunks = _splitter().split_text(text)
+    vectors = await get_embeddings().aembed_documents(chunks)
+    await vectorstore.add(chat_id, vectors, chunks, source=stored.sha256)
+    return chunks
+
+
+async def retrieve(chat_id: int, query: str) -> list[str]:
+    """Chunks from the chat's uploaded files most relevant to `query`."""
+    index = await vectorstore.load(chat_id)
+    if not len(index):
+        return []
+    query_vector = await get_embeddings().aembed_query(query)
+    hits = index.search(query_vector, settings.retrieval_top_k)
+    return [text for score, text in hits if score >= settings.retrieval_min_score]
+
+
+def with_file_context(messages: list, passages: list[str]) -> list:
+    """Insert retrieved passages just before the newest message."""
+    if not passages:
+        return messages
+    context = SystemMessage(
+        "Relevant excerpts from files the user uploaded to this chat:\n\n"
+        + "\n\n---\n\n".join(passages)
+    )
+    return messages[:-1] + [context, messages[-1]]
@@ -0,0 +1,154 @@
+"""In-process scheduler for LLM work that shouldn't hold a request open.
+
+Jobs run as asyncio tasks in this worker, at most
+`job_concurrency_per_model` at a time per model, with their state kept in
+the jobs table so any worker can answer GET /jobs/{id}.
+
+Each worker holds a lease on the jobs it runs and renews it while they
+run. A job whose lease lapses, because its worker died or was replaced,
+is marked failed by whichever worker notices first rather than silently
+lost; jobs of live workers are left alone.
+"""
+import asyncio
+import datetime
+import logging
+import uuid
+from fastapi import status
+from fastapi.responses import JSONResponse
+from sqlalchemy import or_, update
+from . import models
+from .config import settings
+from .database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+PENDING = ("queued", "running")
+
+
+class JobScheduler:
+    def __init__(self, concurrency_per_model: int):
+        self.concurrency_per_model = concurrency_per_model
+        self._semaphores = {}
+        self._tasks = {}
+        self._done = {}
+        self._heartbeat = None
+        # Set per process in start(), so forked workers don't share one
+        self.owner = None
+
+    def _lease(self) -> datetime.datetime:
+        return datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=settings.job_lease_seconds)
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(self.concurrency_per_model)
+        return self._semaphores[model]
+
+    async def submit(self, user_id: int, kind: str, model: str, work, chat_id: int | None = None) -> str:
+        """Record a queued job and start `work` (a coroutine function) in the background.
+
+        `work` must not use the submitting request's session; it runs after
+        the response has been sent.
+        """
+        job_id = uuid.uuid4().hex
+        async with AsyncSessionLocal() as db:
+            db.add(models.Job(id=job_id, user_id=user_id, chat_id=chat_id, kind=kind, model=model,
+                              status="queued", owner=self.owner, lease_expires_at=self._lease()))
+            await db.commit()
+
+        self._done[job_id] = asyncio.Event()
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id, model, work))
+        return job_id
+
+    async def _run(self, job_id: str, model: str, work):
+        try:
+            async with self._semaphore(model):
+                await self._set(job_id, status="running")
+                try:
+                    result = await work()
+                except Exception as e:
+                    logger.exception("Job %s failed", job_id)
+                    await self._set(job_id, status="failed", error=str(e) or type(e).__name__)
+                else:
+                    await self._set(job_id, status="succeeded", result=result)
+        finally:
+            self._tasks.pop(job_id, None)
+            self._done.pop(job_id).set()
+
+    async def _set(self, job_id: str, **values):
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(models.Job).where(models.Job.id == job_id).values(**values))
+            await db.commit()
+
+    async def wait(self, job_id: str, timeout: float) -> None:
+        """Block until `job_id` finishes or `timeout` passes, if it runs in this worker."""
+        done = self._done.get(job_id)
+        if done is None:
+            return
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def renew(self) -> None:
+        """Extend the lease on every job this worker is running or has queued."""
+        if not self._tasks:
+            return
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.Job)
+                .where(models.Job.id.in_(list(self._tasks)), models.Job.status.in_(PENDING))
+                .values(lease_expires_at=self._lease())
+            )
+            await db.commit()
+
+    async def recover(self) -> None:
+        """Fail pending jobs whose worker stopped renewing their lease."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.Job)
+                .where(models.Job.status.in_(PENDING),
+                       or_(models.Job.lease_expires_at.is_(None), models.Job.lease_expires_at < now))
+                .values(status="failed", error="Interrupted by a server restart")
+            )
+            await db.commit()
+
+    async def _keep_leases(self):
+        while True:
+            await asyncio.sleep(settings.job_lease_seconds / 3)
+            try:
+                await self.renew()
+                await self.recover()
+            except Exception:
+                logger.exception("Renewing job leases failed")
+
+    async def start(self) -> None:
+        """Take an owner id, fail orphaned jobs and start renewing leases."""
+        self.owner = uuid.uuid4().hex
+        await self.recover()
+        self._heartbeat = asyncio.create_task(self._keep_leases())
+
+    async def drain(self, timeout: float) -> None:
+        """Give running jobs up to `timeout` seconds to finish, then cancel the rest."""
+        tasks = list(self._tasks.values())
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
+
+def accepted(job_id: str) -> JSONResponse:
+    """202 response pointing the client at the job's status URL."""
+    location = f"/jobs/{job_id}"
+    return JSONResponse(
+        {"job_id": job_id, "status": "queued", "status_url": location},
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"Location": location},
+    )
+
+
+scheduler = JobScheduler(settings.job_concurrency_per_model)
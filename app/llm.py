@@ -0,0 +1,98 @@
+"""Process-wide registry of chat model clients.
+
+Each model gets one client, built on first use and shared by every request,
+so its HTTP connection pool (and the TLS sessions in it) stays warm instead
+of being rebuilt per message. Provider packages are imported when their
+first client is built, so workers that never use a provider don't load it.
+"""
+import threading
+import httpx
+from fastapi import HTTPException
+from . import admission, completion_cache, metrics
+from .config import settings
+
+
+class LLMRegistry:
+    def __init__(self, settings):
+        self.settings = settings
+        self._clients = {}
+        self._http_clients = []
+        self._lock = threading.Lock()
+
+    def get(self, model: str | None = None):
+        """Return the shared client for `model` (the configured default if None)."""
+        model = model or self.settings.llm_default_model
+        client = self._clients.get(model)
+        if client is not None:
+            return client
+
+        provider = self.settings.llm_models.get(model)
+        if provider is None:
+            raise HTTPException(status_code=400, detail=f"Unknown model '{model}'")
+
+        with self._lock:
+            if model not in self._clients:
+                self._clients[model] = self._build(provider, model)
+            return self._clients[model]
+
+    def gated(self, model: str | None, user_id: int, bounded: bool = True, fresh: bool = False):
+        """Return the client for `model` with calls admitted through its gate for `user_id`.
+
+        Unbounded clients wait for a slot however long the queue is; they're
+        for background jobs, which have no client to send a 429 to. When the
+        completion cache is enabled, repeated prompts are answered from it
+        unless `fresh` is set.
+        """
+        model = model or self.settings.llm_default_model
+        client = self.get(model)
+        llm = metrics.InstrumentedLLM(client, model) if self.settings.metrics_enabled else client
+        llm = admission.GatedLLM(llm, admission.gate(model), user_id, bounded)
+        if self.settings.completion_cache_enabled:
+            params = {"temperature": getattr(client, "temperature", None)}
+            llm = completion_cache.CachedLLM(llm, model, params, fresh)
+        return llm
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=self.settings.llm_max_connections,
+            max_keepalive_connections=self.settings.llm_max_keepalive_connections,
+        )
+
+    def _build(self, provider: str, model: str):
+        timeout = self.settings.llm_timeout
+        if provider == "openai":
+            from langchain_openai import ChatOpenAI
+            http_client = httpx.Client(limits=self._limits(), timeout=timeout)
+            http_async_client = httpx.AsyncClient(limits=self._limits(), timeout=timeout)
+            self._http_clients += [http_client, http_async_client]
+            return ChatOpenAI(
+                model=model,
+                temperature=self.settings.llm_temperature,
+                api_key=self.settings.openai_api_key,
+                base_url=self.settings.openai_base_url,
+                timeout=timeout,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+        if provider == "ollama":
+            from langchain_ollama import ChatOllama
+            # ChatOllama hands client_kwargs straight to its httpx clients
+            return ChatOllama(
+                model=model,
+                temperature=self.settings.llm_temperature,
+                base_url=self.settings.ollama_base_url,
+                client_kwargs={"limits": self._limits(), "timeout": timeout},
+            )
+        raise ValueError(f"Unsupported LLM provider '{provider}' for model '{model}'")
+
+    async def aclose(self):
+        for client in self._http_clients:
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+            else:
+                client.close()
+        self._http_clients.clear()
+        self._clients.clear()
+
+
+registry = LLMRegistry(settings)
@@ -1,11 +1,43 @@
+from contextlib import asynccontextmanager
+import anyio
 from fastapi import FastAPI
-from .database import Base, engine
-from .routers import auth, chat, user, file, messages
+from .config import settings
+from .database import async_engine
+from .embeddings import get_embeddings
+from .jobs import scheduler
+from .llm import registry
+from .metrics import MetricsMiddleware, instrument_engine
+from .replicas import replicas
+from . import context, ingest, stats  # stats registers the chat/user counter listeners
+from .utils import shutdown_hash_pool
+from .routers import auth, chat, user, file, messages, jobs, admission, metrics, search, backup, ws
 from fastapi.middleware.cors import CORSMiddleware
 
-Base.metadata.create_all(bind=engine)
+def warm_up():
+    """Build what the first requests would otherwise wait for: every configured
+    model's client (importing its provider), the tokenizer, the text splitter
+    and the embedding model."""
+    for model in settings.llm_models:
+        registry.get(model)
+    context._encoding()
+    ingest._splitter()
+    get_embeddings()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.warm_up:
+        await anyio.to_thread.run_sync(warm_up)
+    await replicas.start()
+    await scheduler.start()
+    yield
+    # Let background jobs finish, then release pooled LLM connections, hashing workers
+    # and replica pools
+    await scheduler.drain(timeout=30)
+    await registry.aclose()
+    shutdown_hash_pool()
+    await replicas.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # Allow your frontend domain
 origins = [
@@ -21,9 +53,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(async_engine)
+    for replica in replicas.replicas:
+        instrument_engine(replica.engine)
+
 app.include_router(auth.router)
 app.include_router(chat.router)
 app.include_router(user.router)
 app.include_router(file.router)
 app.include_router(messages.router)
+app.include_router(search.router)
+app.include_router(backup.router)
+app.include_router(ws.router)
+app.include_router(jobs.router)
+app.include_router(admission.router)
+app.include_router(metrics.router)
 
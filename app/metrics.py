@@ -0,0 +1,329 @@
+"""Request, database, LLM and span metrics in the Prometheus text format.
+
+A small self-contained implementation: counters and histograms keyed by
+label values, rendered on GET /metrics. Everything is registered up front,
+but nothing is recorded unless `settings.metrics_enabled` is set; when it
+isn't, the middleware and SQLAlchemy listeners are never installed and
+`span()` hands back a shared no-op context manager.
+
+Values are per worker process, like the other in-process state here.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+import anyio.to_thread
+from sqlalchemy import event
+from .config import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, labels)} {value}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(Metric):
+    """A gauge read from `collect()` at scrape time: an iterable of (labels, value)."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels=(), collect=None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, labels)} {value}"
+            for labels, value in self.collect()
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _labels(self.label_names, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# HTTP
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.",
+                   ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds",
+                            "Time from request start until the last body byte is sent.",
+                            ("method", "route"))
+
+# Database
+REQUEST_QUERIES = Histogram("db_queries_per_request", "SQL statements executed per request.",
+                            ("route",), buckets=COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("db_seconds_per_request", "Time spent in SQL statements per request.",
+                               ("route",))
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "Duration of individual SQL statements.")
+
+# LLM
+LLM_SECONDS = Histogram("llm_request_duration_seconds", "LLM call duration, excluding queue wait.",
+                        ("model", "mode"), buckets=LLM_BUCKETS)
+LLM_FIRST_TOKEN_SECONDS = Histogram("llm_time_to_first_token_seconds",
+                                    "Time until a streamed LLM call yields its first content.",
+                                    ("model",), buckets=LLM_BUCKETS)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens sent to and received from LLMs.",
+                     ("model", "direction"))
+LLM_ERRORS = Counter("llm_errors_total", "LLM calls that raised.", ("model",))
+
+# Spans around hot-path CPU work (bcrypt, JWT)
+SPAN_SECONDS = Histogram("span_duration_seconds", "Duration of instrumented code sections.",
+                         ("span",))
+
+
+def _threadpool():
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    stats = limiter.statistics()
+    yield ("busy",), stats.borrowed_tokens
+    yield ("total",), limiter.total_tokens
+    yield ("waiting",), stats.tasks_waiting
+
+
+def _admission():
+    from . import admission
+    for model, stats in admission.snapshot().items():
+        yield (model, "in_flight"), stats["in_flight"]
+        yield (model, "queued"), stats["queued"]
+
+
+def _completion_cache():
+    from .completion_cache import cache
+    yield ("hit",), cache.hits
+    yield ("miss",), cache.misses
+    yield ("bypass",), cache.bypassed
+
+
+def _replica_health():
+    from .replicas import replicas
+    for name, state in replicas.snapshot().items():
+        yield (name,), int(state["healthy"])
+
+
+def _replica_lag():
+    from .replicas import replicas
+    for name, state in replicas.snapshot().items():
+        if state["lag_seconds"] is not None:
+            yield (name,), state["lag_seconds"]
+
+
+Gauge("threadpool_threads", "Worker threads of the request threadpool (sync endpoints and dependencies).",
+      ("state",), collect=_threadpool)
+Gauge("llm_calls", "LLM calls running or queued behind the admission gate.",
+      ("model", "state"), collect=_admission)
+Gauge("completion_cache_lookups", "Completion cache lookups by outcome since start.",
+      ("outcome",), collect=_completion_cache)
+Gauge("db_replica_healthy", "1 while a read replica is in rotation, as of its last health check.",
+      ("replica",), collect=_replica_health)
+Gauge("db_replica_lag_seconds", "Replay lag of each read replica at its last health check.",
+      ("replica",), collect=_replica_lag)
+
+
+_NOOP = nullcontext()
+
+
+@contextmanager
+def _timed(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - started, name)
+
+
+def span(name: str):
+    """Time a block under span_duration_seconds{span=name}; free when metrics are off."""
+    return _timed(name) if settings.metrics_enabled else _NOOP
+
+
+# Per-request [statement count, seconds], set by the middleware
+_request_db = contextvars.ContextVar("request_db", default=None)
+
+
+def instrument_engine(engine):
+    target = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(target, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(target, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        QUERY_SECONDS.observe(elapsed)
+        totals = _request_db.get()
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += elapsed
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed bodies aren't buffered."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        totals = [0, 0.0]
+        token = _request_db.set(totals)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db.reset(token)
+            # The matched route's template, so /chats/1 and /chats/2 share a series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            REQUESTS.inc(method, route, str(status))
+            REQUEST_SECONDS.observe(elapsed, method, route)
+            REQUEST_QUERIES.observe(totals[0], route)
+            REQUEST_DB_SECONDS.observe(totals[1], route)
+
+
+def _usage(message):
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("input_tokens"), usage.get("output_tokens")
+
+
+def _count_tokens(messages) -> int:
+    from .context import count_tokens
+    return sum(count_tokens(str(message.content)) for message in messages)
+
+
+class InstrumentedLLM:
+    """Records duration, time to first token and token counts of a model's calls.
+
+    Token counts come from the provider's usage metadata when it reports
+    them and are estimated locally otherwise.
+    """
+
+    def __init__(self, llm, model: str):
+        self.llm = llm
+        self.model = model
+
+    def _tokens(self, messages, reply, usage):
+        prompt_tokens, completion_tokens = usage
+        LLM_TOKENS.inc(self.model, "prompt",
+                       amount=prompt_tokens if prompt_tokens is not None else _count_tokens(messages))
+        LLM_TOKENS.inc(self.model, "completion",
+                       amount=completion_tokens if completion_tokens is not None
+                       else _count_tokens([reply]) if reply.content else 0)
+
+    async def ainvoke(self, messages, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.llm.ainvoke(messages, **kwargs)
+        except Exception:
+            LLM_ERRORS.inc(self.model)
+            raise
+        LLM_SECONDS.observe(time.perf_counter() - started, self.model, "invoke")
+        self._tokens(messages, response, _usage(response))
+        return response
+
+    async def astream(self, messages, **kwargs):
+        started = time.perf_counter()
+        reply, first_token_seen = None, False
+        try:
+            async for chunk in self.llm.astream(messages, **kwargs):
+                # Providers often open with a role-only chunk; the first token is the first content
+                if not first_token_seen and chunk.content:
+                    first_token_seen = True
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, self.model)
+                reply = chunk if reply is None else reply + chunk
+                yield chunk
+        except Exception:
+            LLM_ERRORS.inc(self.model)
+            raise
+        LLM_SECONDS.observe(time.perf_counter() - started, self.model, "stream")
+        if reply is not None:
+            self._tokens(messages, reply, _usage(reply))
@@ -1,7 +1,11 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy import JSON, Column, Computed, DateTime, ForeignKey, Index, Integer, String, Text, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from .database import Base
 from sqlalchemy.orm import relationship
 
+# Text search configuration of messages.search_vector; queries must use the same one
+SEARCH_CONFIG = "english"
+
 class User(Base):
     __tablename__ = "users"
 
@@ -9,17 +13,32 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     password = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Denormalized totals, kept current by app.stats; see reconcile() there
+    chat_count = Column(Integer, nullable=False, server_default="0")
+    message_count = Column(Integer, nullable=False, server_default="0")
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
 
     chats = relationship("Chat", back_populates="user")
 
 class Chat(Base):
     __tablename__ = "chats"
+    __table_args__ = (
+        # Backs the (updated_at, id) keyset pagination of GET /chats
+        Index("ix_chats_user_id_updated_at", "user_id", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, default="New Chat")
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Rolling summary of turns that no longer fit the context window,
+    # covering every message up to and including summary_message_id
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
+    # Denormalized, kept current by app.stats
+    message_count = Column(Integer, nullable=False, server_default="0")
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
 
     user = relationship("User", back_populates="chats")
     messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
@@ -27,11 +46,61 @@ class Chat(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Backs the (created_at, id) keyset pagination of GET /chats/{id}/messages
+        Index("ix_messages_chat_id_created_at", "chat_id", "created_at"),
+        # Backs GET /search
+        Index("ix_messages_search_vector", "search_vector", postgresql_using="gin"),
+    )
+    # search_vector lives in the table but not on the mapped class, so the ORM
+    # never fetches it back after inserts; queries use Message.__table__.c
+    __mapper_args__ = {"exclude_properties": ["search_vector"]}
 
     id = Column(Integer, primary_key=True, index=True)
     chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
     sender = Column(Text, nullable=False)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    search_vector = Column(TSVECTOR, Computed(f"to_tsvector('{SEARCH_CONFIG}', content)", persisted=True))
 
     chat = relationship("Chat", back_populates="messages")
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    # SHA-256 of the token; the token itself is never stored
+    token_hash = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    # uuid4 hex, so ids can't be guessed from one another
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    chat_id = Column(Integer, ForeignKey("chats.id", ondelete="CASCADE"), nullable=True, index=True)
+    kind = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    # queued -> running -> succeeded | failed
+    status = Column(String, nullable=False, default="queued")
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    # Worker running the job, and until when it's presumed alive; see app.jobs
+    owner = Column(String(32), nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class CachedCompletion(Base):
+    __tablename__ = "completion_cache"
+
+    # SHA-256 of model, parameters and normalized messages
+    key = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
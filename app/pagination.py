@@ -0,0 +1,47 @@
+"""Opaque keyset-pagination cursors.
+
+A cursor is the sort key of the last row on a page, JSON-encoded and
+base64url-wrapped so clients treat it as an opaque token.
+"""
+import base64
+import datetime
+import json
+from fastapi import HTTPException
+
+
+def _default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, default=_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _check(value, kind):
+    if kind is datetime.datetime:
+        return datetime.datetime.fromisoformat(value)
+    # JSON has one number type; a whole-number float comes back as an int
+    if kind is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, bool) or not isinstance(value, kind):
+        raise TypeError(f"Expected {kind.__name__}")
+    return value
+
+
+def decode_cursor(cursor: str, *kinds: type) -> list:
+    """The values in `cursor`, which must match `kinds` one for one.
+
+    Cursors come back from clients, so anything else is a 400 rather than
+    an error further down.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(kinds):
+            raise ValueError("Wrong number of values")
+        return [_check(value, kind) for value, kind in zip(values, kinds)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
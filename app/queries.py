@@ -0,0 +1,71 @@
+"""Read queries shaped for the response models in schemas.py.
+
+Each helper loads exactly the columns its schema serializes, and eager-loads
+any relationship the schema walks, so serializing a response never triggers
+a lazy load. That keeps every endpoint at a fixed, small number of queries.
+"""
+from contextlib import contextmanager
+from sqlalchemy import event, select
+from sqlalchemy.orm import load_only, selectinload
+from . import models
+from .database import async_engine
+
+# Column sets mirroring ChatOut and MessageOut
+CHAT_OUT_COLUMNS = (models.Chat.id, models.Chat.title, models.Chat.created_at, models.Chat.updated_at)
+MESSAGE_OUT_COLUMNS = (models.Message.id, models.Message.sender, models.Message.content,
+                       models.Message.created_at)
+
+
+def select_chat_summaries(user_id: int):
+    """Column-only rows for ChatOut; no Chat instances are built."""
+    return select(*CHAT_OUT_COLUMNS).where(models.Chat.user_id == user_id)
+
+
+def select_messages(chat_id: int):
+    """Column-only rows for MessageOut."""
+    return select(*MESSAGE_OUT_COLUMNS).where(models.Message.chat_id == chat_id)
+
+
+async def get_chat_detail(db, chat_id: int, user_id: int):
+    """An owned chat with its messages for ChatOutDetail (two queries)."""
+    return await db.scalar(
+        select(models.Chat)
+        .where(models.Chat.id == chat_id, models.Chat.user_id == user_id)
+        .options(
+            load_only(*CHAT_OUT_COLUMNS),
+            selectinload(models.Chat.messages).load_only(*MESSAGE_OUT_COLUMNS),
+        )
+    )
+
+
+async def get_user_detail(db, user_id: int):
+    """A user with chat summaries for UserOut (two queries)."""
+    return await db.scalar(
+        select(models.User)
+        .where(models.User.id == user_id)
+        .options(
+            load_only(models.User.id, models.User.email, models.User.created_at),
+            selectinload(models.User.chats).load_only(*CHAT_OUT_COLUMNS),
+        )
+    )
+
+
+@contextmanager
+def count_queries(engine=async_engine):
+    """Collect the SQL statements executed on `engine` inside the block.
+
+        with count_queries() as statements:
+            ...
+        assert len(statements) == 2
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    target = getattr(engine, "sync_engine", engine)
+    event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(target, "before_cursor_execute", before_cursor_execute)
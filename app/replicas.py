@@ -0,0 +1,141 @@
+"""Routing read-only endpoints to read replicas.
+
+`settings.database_replica_urls` lists the replicas; with none configured
+everything reads from the primary as before. `get_read_db` is a drop-in for
+`get_db` on endpoints that only read: it hands out sessions round-robin over
+the replicas that passed their last health check, and falls back to the
+primary when
+
+- no replica is healthy,
+- the caller wrote within the last `read_your_writes_seconds` (see
+  `note_write`), so they see their own new messages and chats, or
+- the request sends `X-Read-Primary: 1`.
+
+The read-your-writes window is kept per worker process. With several
+workers, a client that must see a write on its very next request should
+send the header.
+
+A replica counts as healthy when it answers and its replay lag is within
+`database_replica_max_lag_seconds`. The primary always reports no lag, so
+tests can list the primary's own URL as a replica and exercise both roles
+against one database.
+"""
+import asyncio
+import itertools
+import logging
+from cachetools import TTLCache
+from fastapi import Depends, Request
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from .config import settings
+from .database import AsyncSessionLocal, create_app_engine
+from .oauth2 import get_user_id
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica's replay is behind; 0 when it has replayed everything it
+# received, so an idle primary doesn't read as an ever-growing lag
+LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+# user id -> True while that user's reads should stay on the primary
+RECENT_WRITERS = TTLCache(maxsize=100_000, ttl=settings.read_your_writes_seconds)
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = create_app_engine(url)
+        # Health checks get their own connection, so a pool exhausted by
+        # requests can't make a replica look down (or stall the monitor)
+        self.check_engine = create_app_engine(url, pooled=False)
+        self.sessions = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+        self.healthy = False
+        self.lag = None
+
+    async def check(self):
+        try:
+            async with asyncio.timeout(settings.database_replica_check_seconds):
+                async with self.check_engine.connect() as conn:
+                    self.lag = float(await conn.scalar(LAG_QUERY))
+            healthy = self.lag <= settings.database_replica_max_lag_seconds
+        except Exception as e:
+            logger.debug("Replica %s failed its health check: %s", self.name, e)
+            self.lag, healthy = None, False
+
+        if healthy != self.healthy:
+            logger.warning("Replica %s is %s (lag %s)", self.name,
+                           "back in rotation" if healthy else "out of rotation", self.lag)
+        self.healthy = healthy
+
+
+class ReplicaSet:
+    def __init__(self, urls: list[str]):
+        self.replicas = [Replica(f"replica{i}", url) for i, url in enumerate(urls)]
+        self._next = itertools.count()
+        self._task = None
+
+    def pick(self) -> Replica | None:
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    async def check_all(self):
+        await asyncio.gather(*(r.check() for r in self.replicas))
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(settings.database_replica_check_seconds)
+            await self.check_all()
+
+    async def start(self):
+        """Check every replica once, then keep checking in the background."""
+        if self.replicas and self._task is None:
+            await self.check_all()
+            self._task = asyncio.create_task(self._monitor())
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for r in self.replicas:
+            await r.engine.dispose()
+            await r.check_engine.dispose()
+
+    def snapshot(self) -> dict:
+        return {r.name: {"healthy": r.healthy, "lag_seconds": r.lag} for r in self.replicas}
+
+
+replicas = ReplicaSet(settings.database_replica_urls)
+
+
+def note_write(user_id: int):
+    """Keep `user_id`'s reads on the primary for the read-your-writes window."""
+    if replicas.replicas:
+        RECENT_WRITERS[user_id] = True
+
+
+async def get_read_db(request: Request, user_id: int = Depends(get_user_id)):
+    replica = None
+    if request.headers.get("x-read-primary") != "1" and user_id not in RECENT_WRITERS:
+        replica = replicas.pick()
+
+    if replica is None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+
+    async with replica.sessions() as db:
+        try:
+            yield db
+        except (OSError, DBAPIError) as e:
+            # Take it out of rotation now rather than at the next health check
+            if isinstance(e, OSError) or e.connection_invalidated:
+                replica.healthy = False
+            raise
@@ -0,0 +1,32 @@
+"""Generating and persisting assistant replies outside a request session.
+
+Streaming bodies and background jobs outlive the request that started them,
+and with it the request-scoped session, so they write through fresh ones.
+"""
+from sqlalchemy import func, update
+from . import models
+from .database import AsyncSessionLocal
+
+
+async def save_reply(chat_id: int, reply: str):
+    """Persist an assistant reply; returns its id, or None when `reply` is empty."""
+    async with AsyncSessionLocal() as db:
+        bot_message = None
+        if reply:
+            bot_message = models.Message(chat_id=chat_id, sender="assistant", content=reply)
+            db.add(bot_message)
+
+        await db.execute(
+            update(models.Chat)
+            .where(models.Chat.id == chat_id)
+            .values(updated_at=func.now())
+        )
+        await db.commit()
+        return bot_message.id if bot_message else None
+
+
+async def generate_reply(llm, messages, chat_id: int) -> dict:
+    """Run the LLM to completion and save its reply to `chat_id`."""
+    reply = (await llm.ainvoke(messages)).content
+    message_id = await save_reply(chat_id, reply)
+    return {"reply": reply, "message_id": message_id, "chat_id": chat_id}
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends
+from ..oauth2 import get_current_user
+from .. import admission, completion_cache, schemas
+
+router = APIRouter(tags=['LLM'])
+
+
+@router.get("/llm/stats")
+async def get_llm_stats(user: schemas.UserPrincipal = Depends(get_current_user)):
+    # In-flight calls, queue depth and queue wait per model, plus cache
+    # hit/miss counts, all for this worker
+    return {
+        "models": admission.snapshot(),
+        "completion_cache": completion_cache.cache.snapshot(),
+    }
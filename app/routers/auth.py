@@ -1,29 +1,37 @@
+import logging
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import database, models, utils
-from ..oauth2 import create_access_token, create_refresh_token, decode_token, get_current_user
-from ..schemas import UserLogin, RefreshRequest
+from ..tokens import store as token_store
+from ..oauth2 import create_access_token, create_refresh_token, decode_token, get_current_user, token_claims
+from ..schemas import UserLogin, RefreshRequest, UserPrincipal
 
-router = APIRouter(tags=['Authentication'])
+logger = logging.getLogger(__name__)
 
-REFRESH_TOKENS = set()
+router = APIRouter(tags=['Authentication'])
 
 @router.post("/login")
-def login(request: UserLogin,  db: Session = Depends(database.get_db)):
+async def login(request: UserLogin,  db: AsyncSession = Depends(database.get_db)):
 
-    user = db.query(models.User).filter(models.User.email == request.email).first()
+    user = await db.scalar(select(models.User).where(models.User.email == request.email))
 
     if not user:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Invalid Credentials")
 
-    if not utils.verify(request.password, user.password):
+    if not await utils.verify(request.password, user.password):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Invalid Credentials")
 
-    access_token = create_access_token({"sub": request.email})
-    refresh_token = create_refresh_token({"sub": request.email})
+    # Re-hash transparently when the configured bcrypt cost has changed
+    if utils.needs_update(user.password):
+        user.password = await utils.hash(request.password)
+        await db.commit()
+
+    access_token = create_access_token(token_claims(user))
+    refresh_token = create_refresh_token(token_claims(user))
 
     # Store refresh token
-    REFRESH_TOKENS.add(refresh_token)
+    await token_store.add(refresh_token, user.id)
 
     return {
         "access_token": access_token,
@@ -31,27 +39,24 @@ def login(request: UserLogin,  db: Session = Depends(database.get_db)):
     }
 
 @router.post("/refresh")
-def refresh_token(request: RefreshRequest):
+async def refresh_token(request: RefreshRequest):
     payload = decode_token(request.refresh_token)
-    if not payload or payload.get("type") != "refresh":
+    if not payload or payload.get("type") != "refresh" or "uid" not in payload:
         raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
 
-    if request.refresh_token not in REFRESH_TOKENS:
+    if not await token_store.is_active(request.refresh_token):
         raise HTTPException(status_code=401, detail="Refresh token has been revoked")
 
     # Issue new access token
-    new_access_token = create_access_token({"sub": payload["sub"]})
+    new_access_token = create_access_token({"sub": payload["sub"], "uid": payload["uid"]})
     return {"access_token": new_access_token}
 
 @router.post("/logout")
-def logout(current_user: str = Depends(get_current_user)):
+async def logout(current_user: UserPrincipal = Depends(get_current_user)):
     """
-    Logs out the user by invalidating their refresh token (if stored).
+    Logs out the user by revoking all of their refresh tokens.
     """
-    print(f"[Logout] User {current_user} logged out.")
-
-    # Optional: Remove user's refresh token from server-side store
-    # Example: If you stored them as REFRESH_TOKENS[current_user]
-    # REFRESH_TOKENS.pop(current_user, None)
+    await token_store.revoke_user(current_user.id)
+    logger.info("User %s logged out", current_user.id)
 
     return {"detail": "Logged out successfully"}
\ No newline at end of file
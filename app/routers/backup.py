@@ -0,0 +1,252 @@
+"""Export and import of a user's chats as NDJSON.
+
+Each chat is one line, {"type": "chat", ...}, followed by one line per
+message, {"type": "message", ...}, oldest first. Either direction can be
+zstd-compressed. Both stream: exports read keyset-paged batches and
+imports parse the request body as it arrives (compressed bodies via a
+temporary file), so memory stays flat however long the history is.
+"""
+import datetime
+import json
+import tempfile
+import anyio
+import zstandard
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal, get_db
+from ..config import settings
+from ..oauth2 import get_current_user
+from ..replicas import note_write
+from ..stats import reconcile
+from .. import models, schemas
+
+router = APIRouter(tags=['Backup'])
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+FLUSH_BYTES = 64 * 1024
+# Decompressed bytes produced per read, and compressed bytes kept in memory before spilling to disk
+READ_BYTES = 64 * 1024
+SPOOL_BYTES = 1024 * 1024
+
+
+def _line(record: dict) -> bytes:
+    def default(value):
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        raise TypeError(f"Cannot export {type(value).__name__}")
+    return json.dumps(record, default=default).encode() + b"\n"
+
+
+async def _page(query):
+    # Each page gets its own short session; nothing stays open while the client reads
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(query.limit(settings.bulk_batch_size))).all()
+
+
+async def _messages(chat_ids: list[int]):
+    """The messages of `chat_ids`, by chat and then oldest first, a page at a time."""
+    query = select(
+        models.Message.id, models.Message.chat_id, models.Message.sender,
+        models.Message.content, models.Message.created_at,
+    ).where(models.Message.chat_id.in_(chat_ids)).order_by(
+        models.Message.chat_id, models.Message.created_at, models.Message.id
+    )
+    page = await _page(query)
+    while page:
+        for row in page:
+            yield row
+        last = page[-1]
+        page = await _page(query.where(
+            tuple_(models.Message.chat_id, models.Message.created_at, models.Message.id)
+            > (last.chat_id, last.created_at, last.id)
+        ))
+
+
+async def export_lines(user_id: int):
+    """Yield the user's chats and messages as NDJSON, in ~64 KiB chunks.
+
+    Rows are read in keyset-paged batches rather than through one cursor, so
+    a slow download holds no transaction open (which idle_in_transaction
+    timeouts would cut off midway).
+    """
+    query = select(
+        models.Chat.id, models.Chat.title, models.Chat.created_at, models.Chat.updated_at,
+    ).where(models.Chat.user_id == user_id).order_by(models.Chat.id)
+
+    buffer = bytearray()
+
+    def add_chat(chat):
+        buffer.extend(_line({"type": "chat", "id": chat.id, "title": chat.title,
+                             "created_at": chat.created_at, "updated_at": chat.updated_at}))
+
+    chats = await _page(query)
+    while chats:
+        i = 0
+        add_chat(chats[0])
+        async for message in _messages([chat.id for chat in chats]):
+            while chats[i].id != message.chat_id:
+                i += 1
+                add_chat(chats[i])
+            buffer += _line({"type": "message", "chat_id": message.chat_id, "sender": message.sender,
+                             "content": message.content, "created_at": message.created_at})
+            if len(buffer) >= FLUSH_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+        for chat in chats[i + 1:]:
+            add_chat(chat)
+        chats = await _page(query.where(models.Chat.id > chats[-1].id))
+    if buffer:
+        yield bytes(buffer)
+
+
+async def zstd_compressed(chunks):
+    compressor = zstandard.ZstdCompressor().compressobj()
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+@router.get("/export")
+async def export_chats(compression: str | None = Query(None, pattern="^zstd$"),
+                       user: schemas.UserPrincipal = Depends(get_current_user)):
+
+    body = export_lines(user.id)
+    filename, media_type = "chats.ndjson", "application/x-ndjson"
+    if compression == "zstd":
+        body = zstd_compressed(body)
+        filename, media_type = "chats.ndjson.zst", "application/zstd"
+
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+def _too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+
+
+async def import_body(request: Request):
+    """Yield the request body in pieces, decompressing it if it is zstd.
+
+    A few compressed bytes can expand to gigabytes, so compressed bodies are
+    spooled to a temporary file first and read back through a decompressor
+    that produces at most READ_BYTES per call.
+    """
+    chunks = request.stream()
+    first = b""
+    async for first in chunks:
+        if first:
+            break
+    # Sniff the first bytes; exports are only compressed on request
+    if not first.startswith(ZSTD_MAGIC):
+        if first:
+            yield first
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+        size = len(first)
+        await anyio.to_thread.run_sync(spool.write, first)
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > settings.import_max_bytes:
+                raise _too_large(f"Import exceeds {settings.import_max_bytes} bytes")
+            await anyio.to_thread.run_sync(spool.write, chunk)
+        await anyio.to_thread.run_sync(spool.seek, 0)
+
+        reader = zstandard.ZstdDecompressor().stream_reader(spool, read_across_frames=True)
+        while True:
+            try:
+                piece = await anyio.to_thread.run_sync(reader.read, READ_BYTES)
+            except zstandard.ZstdError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid zstd data: {e}")
+            if not piece:
+                return
+            yield piece
+
+
+async def import_lines(request: Request):
+    """Yield (line number, record) from an NDJSON body, zstd-compressed or not."""
+    size, buffer, lineno = 0, bytearray(), 0
+    async for piece in import_body(request):
+        size += len(piece)
+        if size > settings.import_max_bytes:
+            raise _too_large(f"Import exceeds {settings.import_max_bytes} bytes")
+
+        buffer += piece
+        *lines, tail = buffer.split(b"\n")
+        for line in lines:
+            lineno += 1
+            if len(line) > settings.import_max_line_bytes:
+                raise _too_large(f"Line {lineno} exceeds {settings.import_max_line_bytes} bytes")
+            if line.strip():
+                yield lineno, _parse(lineno, line)
+        buffer = tail
+        if len(buffer) > settings.import_max_line_bytes:
+            raise _too_large(f"Line {lineno + 1} exceeds {settings.import_max_line_bytes} bytes")
+    if buffer.strip():
+        yield lineno + 1, _parse(lineno + 1, buffer)
+
+
+def _parse(lineno: int, line: bytes) -> dict:
+    try:
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("not an object")
+        return record
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Line {lineno}: invalid JSON")
+
+
+@router.post("/import", status_code=status.HTTP_201_CREATED)
+async def import_chats(request: Request,
+                       db: AsyncSession = Depends(get_db),
+                       user: schemas.UserPrincipal = Depends(get_current_user)):
+
+    chat_ids = {}  # id in the export -> new chat id
+    batch, chats, messages = [], 0, 0
+
+    async def flush():
+        nonlocal batch
+        if batch:
+            await db.execute(insert(models.Message).values(batch))
+            batch = []
+
+    # One transaction: a bad line rolls back the whole import
+    async for lineno, record in import_lines(request):
+        kind = record.pop("type", None)
+        try:
+            if kind == "chat":
+                chat = schemas.ChatExport(**record)
+                chat_ids[chat.id] = await db.scalar(insert(models.Chat).values(
+                    user_id=user.id, title=chat.title or "New Chat",
+                    created_at=chat.created_at, updated_at=chat.updated_at,
+                ).returning(models.Chat.id))
+                chats += 1
+            elif kind == "message":
+                message = schemas.MessageExport(**record)
+                if message.chat_id not in chat_ids:
+                    raise HTTPException(status_code=400,
+                                        detail=f"Line {lineno}: message before its chat")
+                batch.append({"chat_id": chat_ids[message.chat_id], "sender": message.sender,
+                              "content": message.content, "created_at": message.created_at})
+                messages += 1
+                if len(batch) >= settings.bulk_batch_size:
+                    await flush()
+            else:
+                raise HTTPException(status_code=400, detail=f"Line {lineno}: unknown type {kind!r}")
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=f"Line {lineno}: {e.errors()[0]['msg']}")
+    await flush()
+
+    # Core inserts skip the ORM counter hooks
+    await reconcile(db, user.id)
+    await db.commit()
+    note_write(user.id)
+
+    return {"chats": chats, "messages": messages}
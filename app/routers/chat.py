@@ -1,35 +1,108 @@
-from requests import Session, request
-from langchain_ollama import ChatOllama
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func
+from langchain_core.messages import HumanMessage
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
+from ..config import settings
+from ..context import build_context
+from ..ingest import retrieve, with_file_context
+from ..jobs import accepted, scheduler
+from ..llm import registry
 from ..oauth2 import get_current_user
+from ..pagination import decode_cursor, encode_cursor
+from ..queries import get_chat_detail, select_chat_summaries, select_messages
+from ..replicas import get_read_db, note_write
+from ..replies import generate_reply, save_reply
 from ..schemas import ChatRequest, ChatUpdate
-from .. import models
+from .. import models, vectorstore
 from app import schemas
-import os
+import anyio
+import datetime
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=['Chat'])
 
+
+async def file_passages(chat_id: int, message: str) -> list[str]:
+    """Retrieved file context for `message`; none if retrieval fails, so the chat still gets a reply."""
+    try:
+        return await retrieve(chat_id, message)
+    except Exception:
+        logger.exception("Retrieval for chat %s failed", chat_id)
+        return []
+
+
+def wants_stream(stream: bool, accept: str | None) -> bool:
+    """A client opts into SSE with ?stream=1 or an Accept: text/event-stream header."""
+    return stream or "text/event-stream" in (accept or "")
+
+
+def sse_event(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def stream_reply(llm, messages, chat_id: int, user_id: int):
+    """Relay LLM deltas as server-sent events and save the assembled reply.
+
+    The reply is saved once the stream ends, including when the client
+    disconnects midway and the generator is cancelled or closed. `user_id`'s
+    reads then stay on the primary long enough to see it.
+
+    A stream ends with either a "done" event or, if the LLM fails, an "error"
+    event; what was generated before the failure is kept and its id sent
+    along with the error.
+    """
+    async def event_stream():
+        parts, error, message_id = [], None, None
+        try:
+            async for chunk in llm.astream(messages):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield sse_event({"delta": chunk.content})
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        finally:
+            if parts or error is None:
+                # Shielded so a client disconnect can't cancel the save itself
+                with anyio.CancelScope(shield=True):
+                    message_id = await save_reply(chat_id, "".join(parts))
+                note_write(user_id)
+
+        if error is not None:
+            yield sse_event({"detail": error, "message_id": message_id, "chat_id": chat_id}, event="error")
+            return
+        yield sse_event({"reply": "".join(parts), "message_id": message_id, "chat_id": chat_id},
+                        event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.post("/send/{chat_id}")
-def chat(request: ChatRequest, chat_id: int, 
-         db: Session = Depends(get_db), 
-         username: str = Depends(get_current_user)):
-    
-    user = db.query(models.User).filter(
-        models.User.email == username
-    ).first()
-
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+async def chat(request: ChatRequest, chat_id: int,
+               stream: bool = Query(False),
+               accept: str | None = Header(None),
+               db: AsyncSession = Depends(get_db),
+               user: schemas.UserPrincipal = Depends(get_current_user)):
+
     # chat_id is always provided now
-    chat = db.query(models.Chat).filter(
+    chat = await db.scalar(select(models.Chat).where(
         models.Chat.id == chat_id,
         models.Chat.user_id == user.id
-    ).first()
+    ))
+
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    llm = registry.gated(request.model or settings.llm_send_model, user.id)
+    llm.check()
 
     # Save user's message
     user_message = models.Message(
@@ -39,16 +112,17 @@ def chat(request: ChatRequest, chat_id: int,
     )
     db.add(user_message)
     chat.updated_at = func.now()
-    db.commit()
+    await db.commit()
+    note_write(user.id)
 
     # Send message to the LLM
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0.7,
-        api_key=os.getenv("OPENAI_API_KEY")
-    )
     messages = [HumanMessage(request.message)]
-    llm_response = llm.invoke(messages).content
+    passages = await file_passages(chat.id, request.message)
+    messages = with_file_context(messages, passages)
+    if wants_stream(stream, accept):
+        return stream_reply(llm, messages, chat.id, user.id)
+
+    llm_response = (await llm.ainvoke(messages)).content
 
     # Save bot's response
     bot_message = models.Message(
@@ -58,232 +132,255 @@ def chat(request: ChatRequest, chat_id: int,
     )
     db.add(bot_message)
     chat.updated_at = func.now()
-    db.commit()
+    await db.commit()
+    note_write(user.id)
 
     return {"reply": llm_response}
 
 @router.post("/chats", response_model=schemas.ChatOut)
-def create_chat(db: Session = Depends(get_db), 
-                username: str = Depends(get_current_user)):
-    user = db.query(models.User).filter(
-        models.User.email == username
-    ).first()
-
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+async def create_chat(db: AsyncSession = Depends(get_db),
+                      user: schemas.UserPrincipal = Depends(get_current_user)):
 
     new_chat = models.Chat(user_id=user.id)
     db.add(new_chat)
-    db.commit()
-    db.refresh(new_chat)
+    await db.commit()
+    note_write(user.id)
+    await db.refresh(new_chat)
 
     return new_chat
 
-@router.get("/chats", response_model=list[schemas.ChatOutDetail])
-def get_chats(db: Session = Depends(get_db), 
-              username: str = Depends(get_current_user)):
-    
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+@router.get("/chats", response_model=schemas.ChatPage)
+async def get_chats(cursor: str | None = None,
+                    limit: int = Query(20, ge=1, le=100),
+                    db: AsyncSession = Depends(get_read_db),
+                    user: schemas.UserPrincipal = Depends(get_current_user)):
 
-    chats = (db.query(models.Chat).filter(
-        models.Chat.user_id == user.id
-    ).order_by(models.Chat.updated_at.desc()).all())
-    
-    return chats
+    # Keyset pagination on (updated_at, id), newest first
+    query = select_chat_summaries(user.id).order_by(
+        models.Chat.updated_at.desc(), models.Chat.id.desc()
+    ).limit(limit + 1)
+
+    if cursor:
+        updated_at, last_id = decode_cursor(cursor, datetime.datetime, int)
+        query = query.where(tuple_(models.Chat.updated_at, models.Chat.id) < (updated_at, last_id))
+
+    chats = (await db.execute(query)).all()
+
+    next_cursor = None
+    if len(chats) > limit:
+        chats = chats[:limit]
+        next_cursor = encode_cursor(chats[-1].updated_at, chats[-1].id)
+
+    return {"items": chats, "next_cursor": next_cursor}
 
 
 @router.get("/chats/{chat_id}", response_model=schemas.ChatOutDetail)
-def get_chat(chat_id: int, db: Session = Depends(get_db), 
-             username: str = Depends(get_current_user)):
-    
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    chat = db.query(models.Chat).filter(
-        models.Chat.id == chat_id,
-        models.Chat.user_id == user.id
-    ).first()
+async def get_chat(chat_id: int, db: AsyncSession = Depends(get_read_db),
+                   user: schemas.UserPrincipal = Depends(get_current_user)):
+
+    chat = await get_chat_detail(db, chat_id, user.id)
 
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
     return chat
 
+@router.get("/chats/{chat_id}/messages", response_model=schemas.MessagePage)
+async def get_chat_messages(chat_id: int,
+                            before: int | None = None,
+                            limit: int = Query(50, ge=1, le=200),
+                            db: AsyncSession = Depends(get_read_db),
+                            user: schemas.UserPrincipal = Depends(get_current_user)):
+
+    chat = await db.scalar(select(models.Chat).where(
+        models.Chat.id == chat_id,
+        models.Chat.user_id == user.id
+    ))
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    # Keyset pagination on (created_at, id), walking backwards from `before`
+    query = select_messages(chat.id).order_by(
+        models.Message.created_at.desc(), models.Message.id.desc()
+    ).limit(limit + 1)
+
+    if before is not None:
+        anchor = select(models.Message.created_at).where(
+            models.Message.id == before,
+            models.Message.chat_id == chat.id
+        ).scalar_subquery()
+        query = query.where(tuple_(models.Message.created_at, models.Message.id)
+                            < tuple_(anchor, before))
+
+    messages = (await db.execute(query)).all()
+
+    next_before = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_before = messages[-1].id
+
+    # Pages are returned oldest first so they can be prepended as-is
+    return {"items": messages[::-1], "next_before": next_before}
+
 @router.patch("/chats/{chat_id}")
-def update_chat(chat_id: int, 
-                chat_update: ChatUpdate, 
-                db: Session = Depends(get_db), 
-                username: str = Depends(get_current_user)):
-    
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    chat = db.query(models.Chat).filter(
-        models.Chat.id == chat_id, 
+async def update_chat(chat_id: int,
+                      chat_update: ChatUpdate,
+                      db: AsyncSession = Depends(get_db),
+                      user: schemas.UserPrincipal = Depends(get_current_user)):
+
+    chat = await db.scalar(select(models.Chat).where(
+        models.Chat.id == chat_id,
         models.Chat.user_id == user.id
-    ).first()
-    
+    ))
+
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
     chat.title = chat_update.title
 
     chat.updated_at = func.now()
-    db.commit()
-    db.refresh(chat)
+    await db.commit()
+    note_write(user.id)
+    await db.refresh(chat)
 
     return chat
 
 @router.delete("/chats/{chat_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_chat(chat_id: int, 
-                db: Session = Depends(get_db), 
-                username: str = Depends(get_current_user)):
-    
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    chat = db.query(models.Chat).filter(
-        models.Chat.id == chat_id, 
+async def delete_chat(chat_id: int,
+                      db: AsyncSession = Depends(get_db),
+                      user: schemas.UserPrincipal = Depends(get_current_user)):
+
+    chat = await db.scalar(select(models.Chat).where(
+        models.Chat.id == chat_id,
         models.Chat.user_id == user.id
-    ).first()
+    ))
 
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    db.delete(chat)
-    db.commit()
+    await db.delete(chat)
+    await db.commit()
+    note_write(user.id)
+    await vectorstore.drop(chat.id)
 
     return {"message": "Chat deleted successfully"}
 
 @router.post("/chats/{chat_id}/regenerate")
-def regenerate_response(chat_id: int,
-                        db: Session = Depends(get_db),
-                        username: str = Depends(get_current_user)):
-
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    chat = db.query(models.Chat).filter(
+async def regenerate_response(chat_id: int,
+                              model: str | None = Query(None),
+                              stream: bool = Query(False),
+                              run_async: bool = Query(False, alias="async"),
+                              fresh: bool = Query(False),
+                              accept: str | None = Header(None),
+                              db: AsyncSession = Depends(get_db),
+                              user: schemas.UserPrincipal = Depends(get_current_user)):
+
+    chat = await db.scalar(select(models.Chat).where(
         models.Chat.id == chat_id,
         models.Chat.user_id == user.id
-    ).first()
+    ))
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
-    
-    last_user_msg = (
-        db.query(models.Message)
-        .filter(models.Message.chat_id == chat.id, models.Message.sender == "user")
+
+    last_user_msg = await db.scalar(
+        select(models.Message)
+        .where(models.Message.chat_id == chat.id, models.Message.sender == "user")
         .order_by(models.Message.created_at.desc())
-        .first()
+        .limit(1)
     )
     if not last_user_msg:
         raise HTTPException(status_code=404, detail="No user message found to regenerate")
-    
-    last_ai_msg = (
-        db.query(models.Message)
-        .filter(models.Message.chat_id == chat.id, models.Message.sender == "assistant")
+
+    # Background jobs wait for the model however long it takes; requests may be
+    # turned away. ?fresh=1 skips the completion cache for a new sample.
+    model = model or settings.llm_default_model
+    llm = registry.gated(model, user.id, bounded=not run_async, fresh=fresh)
+    llm.check()
+
+    last_ai_msg = await db.scalar(
+        select(models.Message)
+        .where(models.Message.chat_id == chat.id, models.Message.sender == "assistant")
         .order_by(models.Message.created_at.desc())
-        .first()
+        .limit(1)
     )
     if last_ai_msg:
-        db.delete(last_ai_msg)
-        db.commit()
+        await db.delete(last_ai_msg)
+    # Ends the transaction so no connection is held during the LLM call
+    await db.commit()
+    note_write(user.id)
 
-    llm = ChatOllama(
-        model="llama3:8b",
-        temperature=0.7
-    )
     messages = [HumanMessage(last_user_msg.content)]
-    regenerated_reply = llm.invoke(messages).content
+    if wants_stream(stream, accept):
+        return stream_reply(llm, messages, chat.id, user.id)
 
-    new_ai_msg = models.Message(
-        chat_id=chat.id,
-        sender="assistant",
-        content=regenerated_reply,
-    )
-    db.add(new_ai_msg)
-    db.commit()
-    db.refresh(new_ai_msg)
+    if run_async:
+        # Reply is generated in the background; poll GET /jobs/{id}
+        job_id = await scheduler.submit(
+            user.id, "regenerate", model, lambda: generate_reply(llm, messages, chat.id),
+            chat_id=chat.id,
+        )
+        return accepted(job_id)
 
-    return {"reply": regenerated_reply, "message_id": new_ai_msg.id}
+    result = await generate_reply(llm, messages, chat.id)
+    note_write(user.id)
+    return {"reply": result["reply"], "message_id": result["message_id"]}
 
 @router.post("/chats/{chat_id}/continue")
-def continue_chat(
+async def continue_chat(
     chat_id: int,
     request: schemas.ChatRequest,
-    db: Session = Depends(get_db),
-    username: str = Depends(get_current_user)
+    stream: bool = Query(False),
+    accept: str | None = Header(None),
+    db: AsyncSession = Depends(get_db),
+    user: schemas.UserPrincipal = Depends(get_current_user)
 ):
-    # Validate user
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     # Validate chat
-    chat = db.query(models.Chat).filter(
+    chat = await db.scalar(select(models.Chat).where(
         models.Chat.id == chat_id,
         models.Chat.user_id == user.id
-    ).first()
+    ))
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    # Fetch last N messages for context
-    messages = db.query(models.Message).filter(
-        models.Message.chat_id == chat.id
-    ).order_by(models.Message.created_at.asc()).all()
-
-    # Build chat history for LLM
-    history = []
-    for msg in messages:
-        if msg.sender == "user":
-            history.append(HumanMessage(msg.content))
-        else:
-            history.append(SystemMessage(msg.content))
-
-    # Append the user's new message
-    history.append(HumanMessage(request.message))
-
-    # Get LLM response
-    llm = ChatOllama(
-        model="llama3:8b",  # Same model OpenWebUI uses
-        temperature=0.7
-    )
-    llm_response = llm.invoke(history).content
+    llm = registry.gated(request.model, user.id)
+    llm.check()
 
-    # Save user message
+    # Recent messages that fit the token budget, plus the rolling summary
+    history, window = await build_context(db, chat, request.message, llm)
+
+    # Save user message; committing also returns the connection to the pool
+    # for the length of the LLM call
     user_message = models.Message(
         chat_id=chat.id,
         sender="user",
         content=request.message
     )
     db.add(user_message)
+    chat.updated_at = func.now()
+    await db.commit()
+    note_write(user.id)
 
-    # Save assistant message
-    bot_message = models.Message(
-        chat_id=chat.id,
-        sender="assistant",
-        content=llm_response
-    )
-    db.add(bot_message)
+    # Passages from the chat's uploaded files that match the new message
+    passages = await file_passages(chat.id, request.message)
+    history = with_file_context(history, passages)
 
-    # Update chat timestamp
-    chat.updated_at = func.now()
-    db.commit()
+    if wants_stream(stream, accept):
+        return stream_reply(llm, history, chat.id, user.id)
+
+    llm_response = (await llm.ainvoke(history)).content
+
+    # Save assistant message
+    bot_message_id = await save_reply(chat.id, llm_response)
+    note_write(user.id)
 
     return {
         "reply": llm_response,
         "chat_id": chat.id,
         "messages": [
             {"id": msg.id, "sender": msg.sender, "content": msg.content}
-            for msg in messages
+            for msg in window
         ] + [
             {"id": user_message.id, "sender": "user", "content": request.message},
-            {"id": bot_message.id, "sender": "assistant", "content": llm_response},
+            {"id": bot_message_id, "sender": "assistant", "content": llm_response},
         ]
     }
@@ -1,108 +1,112 @@
+import logging
 import os
-from uuid import uuid4
 from fastapi.responses import FileResponse
 from langchain_core.messages import HumanMessage
-from langchain_ollama import ChatOllama
-from requests import Session, request
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
+from ..config import settings
+from ..ingest import ingest_file
+from ..jobs import accepted, scheduler
+from ..llm import registry
 from ..oauth2 import get_current_user
-from .. import models
+from ..replicas import get_read_db, note_write
+from ..replies import generate_reply
+from ..storage import UploadLimitRoute, file_tag, parse_file_tag, save_upload
+from .. import models, schemas
 from fastapi import File, UploadFile
 
-router = APIRouter(tags=['File'])
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=['File'], route_class=UploadLimitRoute)
+
+
+async def summarize_upload(llm, chat_id: int, stored):
+    """Index an uploaded file for retrieval and have the LLM respond to it."""
+    # Index the file so later turns can retrieve the relevant passages
+    try:
+        chunks = await ingest_file(chat_id, stored)
+    except Exception:
+        logger.exception("Indexing %s for chat %s failed", stored.path, chat_id)
+        chunks = []
+
+    # Prepare input for LLM
+    file_summary_prompt = f"The user uploaded a file named '{stored.filename}'. Please respond accordingly."
+    if chunks:
+        file_summary_prompt += f"\n\nThe file begins:\n{chunks[0]}"
+    messages = [HumanMessage(content=file_summary_prompt)]
+
+    return await generate_reply(llm, messages, chat_id)
+
 
 @router.post("/upload/{chat_id}")
 async def upload_file(chat_id: int,
                       file: UploadFile = File(...), 
-                      db: Session = Depends(get_db),
-                      username: str = Depends(get_current_user)):
+                      model: str | None = Query(None),
+                      run_async: bool = Query(False, alias="async"),
+                      db: AsyncSession = Depends(get_db),
+                      user: schemas.UserPrincipal = Depends(get_current_user)):
     
-    # Check user
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     # Check chat
-    chat = db.query(models.Chat).filter(
+    chat = await db.scalar(select(models.Chat).where(
         models.Chat.id == chat_id,
         models.Chat.user_id == user.id
-    ).first()
+    ))
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    # Ensure uploads folder exists
-    uploads_dir = "uploads"
-    os.makedirs(uploads_dir, exist_ok=True)
-
-    # Generate safe file name to avoid collisions
-    file_ext = os.path.splitext(file.filename)[1]
-    safe_filename = f"{chat_id}_{uuid4().hex}{file_ext}"
-    file_location = os.path.join(uploads_dir, safe_filename)
+    # Background jobs wait for the model however long it takes; requests may be turned away
+    model = model or settings.llm_default_model
+    llm = registry.gated(model, user.id, bounded=not run_async)
+    llm.check()
 
-    # Save file to disk
-    with open(file_location, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    # Stream the file to content-addressed storage
+    stored = await save_upload(file)
 
     # Save a reference in the DB
     file_message = models.Message(
         chat_id=chat.id,
         sender="user",
-        content=f"[file:{file_location}]",  # Store file path or a custom tag
+        content=file_tag(stored),
     )
     db.add(file_message)
-    db.commit()
-    db.refresh(file_message)
-
-    # Prepare input for LLM
-    file_summary_prompt = f"The user uploaded a file named '{file.filename}'. Please respond accordingly."
-    messages = [HumanMessage(content=file_summary_prompt)]
-
-    # Send message to the LLM
-    llm = ChatOllama(
-        model="llama3:8b",
-        temperature=0.7
-    )
-    llm_response = llm.invoke(messages).content
-
-    # Save bot's response
-    bot_message = models.Message(
-        chat_id=chat.id,
-        sender="assistant",
-        content=llm_response,
-    )
-    db.add(bot_message)
-    chat.updated_at = func.now()
-    db.commit()
-
-    return {"reply": llm_response}
+    # Committing returns the connection to the pool before the LLM call
+    await db.commit()
+    note_write(user.id)
+
+    if run_async:
+        # Indexing and the reply happen in the background; poll GET /jobs/{id}
+        job_id = await scheduler.submit(
+            user.id, "upload", model, lambda: summarize_upload(llm, chat.id, stored),
+            chat_id=chat.id,
+        )
+        return accepted(job_id)
+
+    result = await summarize_upload(llm, chat.id, stored)
+    note_write(user.id)
+    return {"reply": result["reply"]}
 
 @router.get("/files/{file_id}")
 async def get_file(file_id: int,
-                   db: Session = Depends(get_db),
-                   username: str = Depends(get_current_user)):
+                   db: AsyncSession = Depends(get_read_db),
+                   user: schemas.UserPrincipal = Depends(get_current_user)):
     
-     # Get user
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Get message with file
-    message = db.query(models.Message).filter(
+    # Get message with file, only from the caller's own chats
+    message = await db.scalar(select(models.Message).where(
         models.Message.id == file_id,
-        models.Message.sender == "user"  # Ensure it's a user-uploaded file
-    ).first()
+        models.Message.sender == "user",  # Ensure it's a user-uploaded file
+        models.Message.chat.has(user_id=user.id)
+    ))
 
-    if not message or not message.content.startswith("[file:"):
+    file_ref = parse_file_tag(message.content) if message else None
+    if not file_ref:
         raise HTTPException(status_code=404, detail="File not found")
 
-    # Extract file path
-    file_path = message.content[6:-1]  # Removes "[file:" and "]"
+    file_path, filename = file_ref
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File does not exist on server")
 
     # Serve the file
     return FileResponse(path=file_path, 
-                        filename=os.path.basename(file_path))
+                        filename=filename)
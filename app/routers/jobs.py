@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from ..config import settings
+from ..jobs import PENDING, scheduler
+from ..oauth2 import get_current_user
+from .. import models, schemas
+
+router = APIRouter(tags=['Jobs'])
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.JobOut)
+async def get_job(job_id: str,
+                  wait: float = Query(0, ge=0),
+                  db: AsyncSession = Depends(get_db),
+                  user: schemas.UserPrincipal = Depends(get_current_user)):
+
+    query = select(models.Job).where(
+        models.Job.id == job_id,
+        models.Job.user_id == user.id
+    )
+    job = await db.scalar(query)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    # ?wait=N long-polls for up to N seconds instead of returning a pending job
+    if wait and job.status in PENDING:
+        await db.commit()
+        await scheduler.wait(job.id, min(wait, settings.job_wait_max_seconds))
+        job = await db.scalar(query.execution_options(populate_existing=True))
+
+    return job
@@ -1,8 +1,9 @@
-from requests import Session
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from ..oauth2 import get_current_user
+from ..replicas import note_write
 from .. import models
 from app import schemas
 
@@ -10,65 +11,54 @@ router = APIRouter(tags=['Chat'])
 
 
 @router.delete("/messages/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_message(message_id: int, 
-                   db: Session = Depends(get_db), 
-                   username: str = Depends(get_current_user)):
-    
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+async def delete_message(message_id: int,
+                         db: AsyncSession = Depends(get_db),
+                         user: schemas.UserPrincipal = Depends(get_current_user)):
 
-    message = db.query(models.Message).filter(
+    message = await db.scalar(select(models.Message).where(
         models.Message.id == message_id,
+        # Scoped to the caller's chats, so this is the ownership check too
         models.Message.chat.has(user_id=user.id)
-    ).first()
+    ))
 
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
-    
-    # Check if the user owns the chat that this message belongs to
-    chat = db.query(models.Chat).filter(models.Chat.id == message.chat_id).first()
-    if not chat or chat.user.email != username:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this message")
-    
-    db.delete(message)
-    db.commit()
+
+    await db.delete(message)
+    await db.commit()
+    note_write(user.id)
 
     return {"message": "Message deleted successfully"}
 
 @router.patch("/{chat_id}/messages/{message_id}")
-def update_message(
+async def update_message(
     chat_id: int,
     message_id: int,
     request: schemas.ChatRequest,
-    db: Session = Depends(get_db),
-    username: str = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    user: schemas.UserPrincipal = Depends(get_current_user)
 ):
-    # Verify user exists
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     # Verify chat belongs to user
-    chat = db.query(models.Chat).filter(
+    chat = await db.scalar(select(models.Chat).where(
         models.Chat.id == chat_id,
         models.Chat.user_id == user.id
-    ).first()
+    ))
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
 
     # Verify message exists in chat
-    message = db.query(models.Message).filter(
+    message = await db.scalar(select(models.Message).where(
         models.Message.id == message_id,
         models.Message.chat_id == chat.id
-    ).first()
+    ))
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
 
     # Update the message content
     message.content = request.message
-    db.commit()
-    db.refresh(message)
+    await db.commit()
+    note_write(user.id)
+    await db.refresh(message)
 
     return {
         "message": "Message updated successfully",
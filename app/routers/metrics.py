@@ -0,0 +1,14 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from ..config import settings
+from .. import metrics
+
+router = APIRouter(tags=['Metrics'])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
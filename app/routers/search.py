@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..oauth2 import get_current_user
+from ..pagination import decode_cursor, encode_cursor
+from ..replicas import get_read_db
+from .. import models, schemas
+
+router = APIRouter(tags=['Search'])
+
+SEARCH_VECTOR = models.Message.__table__.c.search_vector
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2"
+
+
+@router.get("/search", response_model=schemas.SearchPage)
+async def search_messages(q: str = Query(..., min_length=1, max_length=256),
+                          cursor: str | None = None,
+                          limit: int = Query(20, ge=1, le=100),
+                          db: AsyncSession = Depends(get_read_db),
+                          user: schemas.UserPrincipal = Depends(get_current_user)):
+
+    tsquery = func.websearch_to_tsquery(models.SEARCH_CONFIG, q)
+    rank = func.ts_rank_cd(SEARCH_VECTOR, tsquery)
+
+    # Matches come from the GIN index; keyset pagination on (rank, id), best first
+    ranked = select(models.Message.id, models.Message.chat_id, rank.label("rank")).join(
+        models.Chat, models.Chat.id == models.Message.chat_id
+    ).where(
+        models.Chat.user_id == user.id,
+        SEARCH_VECTOR.op("@@")(tsquery)
+    ).order_by(rank.desc(), models.Message.id.desc()).limit(limit + 1)
+
+    if cursor:
+        last_rank, last_id = decode_cursor(cursor, float, int)
+        ranked = ranked.where(tuple_(rank, models.Message.id) < (last_rank, last_id))
+
+    # Snippets are only built for the page being returned
+    ranked = ranked.subquery()
+    query = select(
+        ranked.c.chat_id,
+        ranked.c.id.label("message_id"),
+        models.Message.sender,
+        models.Message.created_at,
+        ranked.c.rank,
+        func.ts_headline(models.SEARCH_CONFIG, models.Message.content, tsquery,
+                         HEADLINE_OPTIONS).label("snippet"),
+    ).join(models.Message, models.Message.id == ranked.c.id).order_by(
+        ranked.c.rank.desc(), ranked.c.id.desc()
+    )
+
+    hits = (await db.execute(query)).all()
+
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = encode_cursor(hits[-1].rank, hits[-1].message_id)
+
+    return {"items": hits, "next_cursor": next_cursor}
@@ -1,38 +1,40 @@
 from fastapi import status, HTTPException, Depends, APIRouter
-from sqlalchemy.orm import Session
-from app.oauth2 import create_access_token, create_refresh_token, get_current_user
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.oauth2 import create_access_token, create_refresh_token, get_current_user, invalidate_user, token_claims
 from .. import models, schemas, utils
 from ..database import get_db
+from ..queries import get_user_detail
+from ..replicas import get_read_db
+from ..tokens import store as token_store
 
 router = APIRouter(tags=['Users'])
 
-REFRESH_TOKENS = set()
-
 @router.post("/users", status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.UserCreate, 
-                db: Session = Depends(get_db)):
-    
-    existing_user = db.query(models.User).filter(
+async def create_user(user: schemas.UserCreate,
+                      db: AsyncSession = Depends(get_db)):
+
+    existing_user = await db.scalar(select(models.User).where(
         models.User.email == user.email
-    ).first()
+    ))
 
     if existing_user:
-        raise HTTPException(status_code=400, 
+        raise HTTPException(status_code=400,
                             detail="Email already registered")
 
-    hashed_password = utils.hash(user.password)
+    hashed_password = await utils.hash(user.password)
     user.password = hashed_password
 
     new_user = models.User(**user.model_dump())
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
-    access_token = create_access_token({"sub": user.email})
-    refresh_token = create_refresh_token({"sub": user.email})
+    access_token = create_access_token(token_claims(new_user))
+    refresh_token = create_refresh_token(token_claims(new_user))
 
     # Store refresh token
-    REFRESH_TOKENS.add(refresh_token)
+    await token_store.add(refresh_token, new_user.id)
 
     return {
         "access_token": access_token,
@@ -40,12 +42,10 @@ def create_user(user: schemas.UserCreate,
     }
 
 @router.get("/users/me", response_model=schemas.UserOut)
-def get_current_user_details(db: Session = Depends(get_db),
-                             current_user: str = Depends(get_current_user)):
+async def get_current_user_details(db: AsyncSession = Depends(get_read_db),
+                                   current_user: schemas.UserPrincipal = Depends(get_current_user)):
 
-    user = db.query(models.User).filter(
-        models.User.email == current_user
-    ).first()
+    user = await get_user_detail(db, current_user.id)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -53,25 +53,25 @@ def get_current_user_details(db: Session = Depends(get_db),
     return user
 
 @router.patch("/users/me", response_model=schemas.UserOut)
-def update_my_account(update: schemas.UserUpdate, 
-                      db: Session = Depends(get_db), 
-                      username: str = Depends(get_current_user)):
-    
-    user = db.query(models.User).filter(
-        models.User.email == username
-    ).first()
-    
+async def update_my_account(update: schemas.UserUpdate,
+                            db: AsyncSession = Depends(get_db),
+                            current_user: schemas.UserPrincipal = Depends(get_current_user)):
+
+    user = await db.get(models.User, current_user.id)
+
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     if update.email:
         user.email = update.email
     if update.password:
-        hashed_password = utils.hash(update.password)
+        hashed_password = await utils.hash(update.password)
         user.password = hashed_password
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user(user.id)
+    await token_store.revoke_user(user.id)
 
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -80,39 +80,22 @@ def update_my_account(update: schemas.UserUpdate,
     )
 
 @router.get("/stats")
-def get_user_stats(
-    db: Session = Depends(get_db),
-    username: str = Depends(get_current_user)
+async def get_user_stats(
+    db: AsyncSession = Depends(get_read_db),
+    user: schemas.UserPrincipal = Depends(get_current_user)
 ):
-    # Get user
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    # Counters are maintained on write (app.stats), so this is one primary-key read
+    totals = (await db.execute(
+        select(models.User.chat_count, models.User.message_count, models.User.last_message_at)
+        .where(models.User.id == user.id)
+    )).first()
 
-    # Count chats
-    chat_count = db.query(models.Chat).filter(models.Chat.user_id == user.id).count()
-
-    # Count messages
-    message_count = (
-        db.query(models.Message)
-        .join(models.Chat)
-        .filter(models.Chat.user_id == user.id)
-        .count()
-    )
-
-    # Find most recent activity
-    last_message = (
-        db.query(models.Message)
-        .join(models.Chat)
-        .filter(models.Chat.user_id == user.id)
-        .order_by(models.Message.created_at.desc())
-        .first()
-    )
-    last_activity = last_message.created_at if last_message else None
+    if not totals:
+        raise HTTPException(status_code=404, detail="User not found")
 
     return {
-        "total_chats": chat_count,
-        "total_messages": message_count,
-        "last_activity": last_activity,
+        "total_chats": totals.chat_count,
+        "total_messages": totals.message_count,
+        "last_activity": totals.last_message_at,
         "user": user.email,
     }
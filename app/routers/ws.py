@@ -0,0 +1,281 @@
+"""WebSocket chat channel: one authenticated connection, many conversations.
+
+Connect to /ws and send {"type": "auth", "token": <access token>} first
+(/ws?token=... also works, but puts the token in access logs). Client
+frames, each with a client-chosen "id" echoed on replies:
+
+    {"type": "send" | "continue", "id", "chat_id", "message", "model"?}
+    {"type": "regenerate", "id", "chat_id", "model"?}
+    {"type": "cancel", "id"}
+    {"type": "sync", "id", "chat_id", "after_id"?}    messages newer than after_id
+    {"type": "ping"} / {"type": "pong"}
+
+Server frames: "start" (with the saved user message id), "token" (a reply
+delta), "done" (with the saved reply's message id), "cancelled", "error"
+(also the answer to a frame that isn't a JSON object),
+"messages" (the answer to sync), "ping" and "pong"; clients answer "ping"
+with "pong" or are disconnected. After a reconnect, sync with the
+last message id seen to pick up where the connection left off.
+
+Replies are produced concurrently, up to ws_max_inflight per connection,
+and all outgoing frames go through one bounded queue. A client that stops
+reading fills it, which pauses the LLM streams feeding it.
+"""
+import asyncio
+import json
+import anyio
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from langchain_core.messages import HumanMessage
+from sqlalchemy import func, select
+from app.database import AsyncSessionLocal
+from ..config import settings
+from ..context import build_context
+from ..ingest import with_file_context
+from ..llm import registry
+from ..oauth2 import decode_token, get_current_user
+from ..queries import select_messages
+from ..replicas import note_write
+from ..replies import save_reply
+from .. import models, schemas
+from .chat import file_passages
+
+router = APIRouter(tags=['Chat'])
+
+
+class ChatSocket:
+    def __init__(self, websocket: WebSocket, user: schemas.UserPrincipal):
+        self.websocket = websocket
+        self.user = user
+        # Frames waiting for the writer; a full queue blocks whoever emits next
+        self.outbox = asyncio.Queue(maxsize=settings.ws_send_queue_size)
+        # Chat ids already checked to belong to this user
+        self.owned = set()
+        self.tasks = {}
+
+    async def emit(self, frame: dict):
+        await self.outbox.put(frame)
+
+    async def writer(self):
+        while True:
+            await self.websocket.send_json(await self.outbox.get())
+
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(settings.ws_heartbeat_seconds)
+            await self.emit({"type": "ping"})
+
+    async def check_owner(self, db, chat_id: int):
+        if chat_id in self.owned:
+            return
+        owned = await db.scalar(select(models.Chat.id).where(
+            models.Chat.id == chat_id,
+            models.Chat.user_id == self.user.id
+        ))
+        if owned is None:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        self.owned.add(chat_id)
+
+    async def stream(self, request_id, llm, messages, chat_id: int):
+        parts = []
+        try:
+            async for chunk in llm.astream(messages):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    await self.emit({"type": "token", "id": request_id, "delta": chunk.content})
+        finally:
+            # Shielded so a cancel or disconnect still saves what was generated
+            with anyio.CancelScope(shield=True):
+                message_id = await save_reply(chat_id, "".join(parts))
+            note_write(self.user.id)
+        await self.emit({"type": "done", "id": request_id, "chat_id": chat_id,
+                         "message_id": message_id, "reply": "".join(parts)})
+
+    async def send(self, frame: dict):
+        chat_id, message = int(frame["chat_id"]), str(frame["message"])
+        llm = registry.gated(frame.get("model") or settings.llm_send_model, self.user.id)
+        llm.check()
+        async with AsyncSessionLocal() as db:
+            await self.check_owner(db, chat_id)
+            user_message = models.Message(chat_id=chat_id, sender="user", content=message)
+            db.add(user_message)
+            await db.execute(models.Chat.__table__.update()
+                             .where(models.Chat.id == chat_id).values(updated_at=func.now()))
+            await db.commit()
+        note_write(self.user.id)
+
+        await self.emit({"type": "start", "id": frame["id"], "chat_id": chat_id,
+                         "user_message_id": user_message.id})
+        messages = with_file_context([HumanMessage(message)], await file_passages(chat_id, message))
+        await self.stream(frame["id"], llm, messages, chat_id)
+
+    async def continue_chat(self, frame: dict):
+        chat_id, message = int(frame["chat_id"]), str(frame["message"])
+        llm = registry.gated(frame.get("model"), self.user.id)
+        llm.check()
+        async with AsyncSessionLocal() as db:
+            await self.check_owner(db, chat_id)
+            chat = await db.get(models.Chat, chat_id)
+            history, _ = await build_context(db, chat, message, llm)
+            user_message = models.Message(chat_id=chat_id, sender="user", content=message)
+            db.add(user_message)
+            chat.updated_at = func.now()
+            await db.commit()
+        note_write(self.user.id)
+
+        await self.emit({"type": "start", "id": frame["id"], "chat_id": chat_id,
+                         "user_message_id": user_message.id})
+        history = with_file_context(history, await file_passages(chat_id, message))
+        await self.stream(frame["id"], llm, history, chat_id)
+
+    async def regenerate(self, frame: dict):
+        chat_id = int(frame["chat_id"])
+        llm = registry.gated(frame.get("model") or settings.llm_default_model, self.user.id)
+        llm.check()
+        async with AsyncSessionLocal() as db:
+            await self.check_owner(db, chat_id)
+            last_user_msg = await db.scalar(
+                select(models.Message)
+                .where(models.Message.chat_id == chat_id, models.Message.sender == "user")
+                .order_by(models.Message.created_at.desc())
+                .limit(1)
+            )
+            if not last_user_msg:
+                raise HTTPException(status_code=404, detail="No user message found to regenerate")
+            last_ai_msg = await db.scalar(
+                select(models.Message)
+                .where(models.Message.chat_id == chat_id, models.Message.sender == "assistant")
+                .order_by(models.Message.created_at.desc())
+                .limit(1)
+            )
+            replaced_id = last_ai_msg.id if last_ai_msg else None
+            if last_ai_msg:
+                await db.delete(last_ai_msg)
+            await db.commit()
+        note_write(self.user.id)
+
+        await self.emit({"type": "start", "id": frame["id"], "chat_id": chat_id,
+                         "replaced_message_id": replaced_id})
+        await self.stream(frame["id"], llm, [HumanMessage(last_user_msg.content)], chat_id)
+
+    async def sync(self, frame: dict):
+        chat_id, after_id = int(frame["chat_id"]), int(frame.get("after_id") or 0)
+        async with AsyncSessionLocal() as db:
+            await self.check_owner(db, chat_id)
+            rows = (await db.execute(
+                select_messages(chat_id)
+                .where(models.Message.id > after_id)
+                .order_by(models.Message.id)
+                .limit(settings.ws_sync_limit + 1)
+            )).all()
+
+        items = [schemas.MessageOut.model_validate(row, from_attributes=True).model_dump(mode="json")
+                 for row in rows[:settings.ws_sync_limit]]
+        await self.emit({"type": "messages", "id": frame.get("id"), "chat_id": chat_id,
+                         "items": items, "more": len(rows) > settings.ws_sync_limit})
+
+    async def run(self, request_id, handler, frame: dict):
+        try:
+            await handler(frame)
+        except HTTPException as e:
+            error = {"type": "error", "id": request_id, "status": e.status_code, "detail": e.detail}
+            if e.headers and "Retry-After" in e.headers:
+                error["retry_after"] = int(e.headers["Retry-After"])
+            await self.emit(error)
+        except (KeyError, TypeError, ValueError) as e:
+            await self.emit({"type": "error", "id": request_id, "status": 400,
+                             "detail": f"Malformed frame: {e}"})
+        except asyncio.CancelledError:
+            # The partial reply is already saved; sync picks it up
+            if not self.outbox.full():
+                self.outbox.put_nowait({"type": "cancelled", "id": request_id})
+            raise
+        except Exception as e:
+            await self.emit({"type": "error", "id": request_id, "status": 500, "detail": str(e)})
+        finally:
+            self.tasks.pop(request_id, None)
+
+    async def dispatch(self, frame: dict):
+        kind, request_id = frame.get("type"), frame.get("id")
+        handlers = {"send": self.send, "continue": self.continue_chat,
+                    "regenerate": self.regenerate, "sync": self.sync}
+
+        if kind == "ping":
+            await self.emit({"type": "pong"})
+        elif kind == "pong":
+            pass
+        elif kind == "cancel":
+            if request_id in self.tasks:
+                self.tasks[request_id].cancel()
+        elif kind not in handlers:
+            await self.reject(request_id, 400, f"Unknown frame type {kind!r}")
+        elif request_id is None or request_id in self.tasks:
+            await self.reject(request_id, 400, "Each request needs an id not already in flight")
+        elif len(self.tasks) >= settings.ws_max_inflight:
+            await self.reject(request_id, 429, "Too many requests in flight on this connection")
+        else:
+            self.tasks[request_id] = asyncio.create_task(self.run(request_id, handlers[kind], frame))
+
+    async def reject(self, request_id, status_code: int, detail: str):
+        await self.emit({"type": "error", "id": request_id, "status": status_code, "detail": detail})
+
+
+async def receive_frame(websocket: WebSocket, timeout: float) -> dict | None:
+    """The next client frame; None if it isn't a JSON object (e.g. a binary frame)."""
+    message = await asyncio.wait_for(websocket.receive(), timeout)
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    try:
+        frame = json.loads(message.get("text") or "")
+    except ValueError:
+        return None
+    return frame if isinstance(frame, dict) else None
+
+
+async def authenticate(websocket: WebSocket) -> schemas.UserPrincipal | None:
+    token = websocket.query_params.get("token")
+    if token is None:
+        try:
+            frame = await receive_frame(websocket, settings.ws_heartbeat_seconds)
+        except (asyncio.TimeoutError, WebSocketDisconnect):
+            return None
+        if frame is None or frame.get("type") != "auth":
+            return None
+        token = frame.get("token")
+
+    payload = decode_token(token if isinstance(token, str) else "")
+    if not payload or payload.get("type") != "access" or "uid" not in payload:
+        return None
+    async with AsyncSessionLocal() as db:
+        try:
+            return await get_current_user(int(payload["uid"]), db)
+        except HTTPException:
+            return None
+
+
+@router.websocket("/ws")
+async def chat_socket(websocket: WebSocket):
+    await websocket.accept()
+    user = await authenticate(websocket)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+        return
+
+    connection = ChatSocket(websocket, user)
+    background = [asyncio.create_task(connection.writer()), asyncio.create_task(connection.heartbeat())]
+    try:
+        while True:
+            # A live client answers pings, so silence this long means it's gone
+            frame = await receive_frame(websocket, settings.ws_heartbeat_seconds * 3)
+            if frame is None:
+                # One bad frame mustn't take down the replies in flight
+                await connection.reject(None, 400, "Frames must be JSON objects")
+            else:
+                await connection.dispatch(frame)
+    except (WebSocketDisconnect, asyncio.TimeoutError):
+        pass
+    finally:
+        for task in list(connection.tasks.values()) + background:
+            task.cancel()
+        await asyncio.gather(*connection.tasks.values(), *background, return_exceptions=True)
+        if websocket.client_state.name == "CONNECTED":
+            await websocket.close()
@@ -1,5 +1,5 @@
 import datetime
-from typing import List, Optional
+from typing import Any, List, Optional
 from pydantic import BaseModel, EmailStr
 
 class UserLogin(BaseModel):
@@ -10,8 +10,14 @@ class UserCreate(BaseModel):
     email: EmailStr
     password: str
 
+class UserPrincipal(BaseModel):
+    """The authenticated caller, as resolved by oauth2.get_current_user."""
+    id: int
+    email: EmailStr
+
 class ChatRequest(BaseModel):
     message: str
+    model: Optional[str] = None
 
 class RefreshRequest(BaseModel):
     refresh_token: str
@@ -44,6 +50,40 @@ class ChatOutDetail(BaseModel):
     class Config:
         orm_mode = True
 
+class ChatPage(BaseModel):
+    items: List[ChatOut]
+    next_cursor: Optional[str] = None
+
+class MessagePage(BaseModel):
+    items: List[MessageOut]
+    next_before: Optional[int] = None
+
+class SearchHit(BaseModel):
+    chat_id: int
+    message_id: int
+    sender: str
+    created_at: datetime.datetime
+    rank: float
+    snippet: str
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
+
+class ChatExport(BaseModel):
+    """A "chat" line of an export; `id` is only used to match its messages on import."""
+    id: int
+    title: Optional[str] = None
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+class MessageExport(BaseModel):
+    """A "message" line of an export, following the line of its chat."""
+    chat_id: int
+    sender: str
+    content: str
+    created_at: datetime.datetime
+
 class UserOut(BaseModel):
     id: int
     email: EmailStr
@@ -63,3 +103,17 @@ class UserUpdate(BaseModel):
     class Config:
         orm_mode = True
 
+
+class JobOut(BaseModel):
+    id: str
+    kind: str
+    model: str
+    status: str
+    chat_id: Optional[int] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+    class Config:
+        orm_mode = True
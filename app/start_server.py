@@ -1,11 +1,167 @@
-import threading
+"""Production launcher: python -m app.start_server
+
+Imports the app and its heavy dependencies once, binds the listening
+socket, then forks `server_workers` uvicorn workers that share it. The
+children inherit the preloaded modules, so neither worker start-up nor the
+first request pays for importing langchain/openai.
+
+SIGTERM or SIGINT is passed on to every worker. Each one stops accepting
+connections, lets in-flight requests and LLM streams finish for up to
+`server_graceful_timeout` seconds, then runs the app's shutdown, which
+drains background jobs. A worker that dies on its own is replaced.
+"""
+import importlib
+import logging
+import math
+import os
+import signal
+import time
 import uvicorn
-from main import app
+from .config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# Imported before forking so every worker shares the work (and the pages)
+PRELOAD = (
+    "numpy",
+    "tiktoken",
+    "openai",
+    "langchain_core.messages",
+    "langchain_openai",
+    "langchain_ollama",
+    "langchain_text_splitters",
+    "app.main",
+)
+
+
+def preload():
+    started = time.perf_counter()
+    for module in PRELOAD:
+        importlib.import_module(module)
+    logger.info("Preloaded %d modules in %.2fs", len(PRELOAD), time.perf_counter() - started)
+
+
+def build_config() -> uvicorn.Config:
+    return uvicorn.Config(
+        "app.main:app",
+        host=settings.server_host,
+        port=settings.server_port,
+        loop=settings.server_loop,
+        http=settings.server_http,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.server_forwarded_allow_ips,
+        timeout_graceful_shutdown=settings.server_graceful_timeout,
+        timeout_keep_alive=settings.server_keep_alive,
+    )
+
+
+def run_worker(config: uvicorn.Config, sock):
+    """Serve on the inherited socket until told to stop. Runs in the child."""
+    from .database import async_engine, engine
+
+    # Connections opened by the parent while preloading must not be shared across processes
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(config: uvicorn.Config, sock) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(config, sock)
+        except BaseException:
+            logger.exception("Worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info("Started worker %d", pid)
+    return pid
+
+
+def supervise(config: uvicorn.Config, sock, workers: int):
+    children = {spawn(config, sock) for _ in range(workers)}
+    deadline = None
+
+    def stop(signum, frame):
+        nonlocal deadline
+        if deadline is None:
+            logger.info("Received %s, draining %d workers", signal.Signals(signum).name, len(children))
+            # Room for the graceful timeout plus the app's own shutdown (job drain)
+            deadline = time.monotonic() + settings.server_graceful_timeout + 40
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if deadline is not None and time.monotonic() > deadline:
+                logger.warning("Workers still running after the drain deadline, killing them")
+                for pid in children:
+                    os.kill(pid, signal.SIGKILL)
+                deadline = float("inf")
+            time.sleep(0.2)
+            continue
+
+        children.discard(pid)
+        if deadline is None:
+            logger.warning("Worker %d exited with status %d, replacing it", pid, os.waitstatus_to_exitcode(status))
+            time.sleep(1)
+            children.add(spawn(config, sock))
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on, within its affinity mask and any cgroup v2 CPU quota."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def worker_count() -> int:
+    """settings.server_workers, or by default as many as the CPUs and connection budget allow."""
+    per_worker = settings.database_pool_size + settings.database_max_overflow
+    budget = max(1, settings.database_max_connections // per_worker)
+    if not settings.server_workers:
+        return min(available_cpus(), budget)
+    if settings.server_workers > budget:
+        logger.warning("%d workers can open %d database connections, more than DATABASE_MAX_CONNECTIONS=%d; "
+                       "lower SERVER_WORKERS or the pool size", settings.server_workers,
+                       settings.server_workers * per_worker, settings.database_max_connections)
+    return settings.server_workers
+
+
+def main():
+    workers = worker_count()
+    if workers > 1 and settings.refresh_token_store == "memory":
+        # Each worker would only know the refresh tokens it issued itself
+        raise SystemExit("REFRESH_TOKEN_STORE=memory only works with SERVER_WORKERS=1; "
+                         "use the database store to run more workers")
+    config = build_config()
+    preload()
+
+    if workers == 1 or not hasattr(os, "fork"):
+        uvicorn.Server(config).run()
+        return
+
+    sock = config.bind_socket()
+    logger.info("Serving on %s:%d with %d workers (loop=%s, http=%s)",
+                settings.server_host, settings.server_port, workers, config.loop, config.http)
+    try:
+        supervise(config, sock, workers)
+    finally:
+        sock.close()
 
-def run_fastapi():
-    uvicorn.run(app, host="127.0.0.1", port=8000, log_level="info")
 
-def start_fastapi_server():
-    # Start FastAPI in a daemon thread
-    server_thread = threading.Thread(target=run_fastapi, daemon=True)
-    server_thread.start()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Denormalized chat and user counters.
+
+Chat.message_count / last_message_at and User.chat_count / message_count /
+last_message_at are adjusted in the same transaction as every ORM insert or
+delete of a Message or Chat, including messages removed by a chat's delete
+cascade. Writes that bypass the ORM unit of work (Core inserts, bulk
+deletes) don't go through here and must be followed by reconcile().
+
+Run `python -m app.stats` to recompute every counter from the base tables.
+"""
+import asyncio
+from collections import Counter
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+from . import models
+from .database import AsyncSessionLocal
+
+Chat = models.Chat
+Message = models.Message
+User = models.User
+
+
+def _user_of(chat_id: int):
+    return select(Chat.user_id).where(Chat.id == chat_id).scalar_subquery()
+
+
+def _last_message_at(chat_id):
+    return select(func.max(Message.created_at)).where(Message.chat_id == chat_id).scalar_subquery()
+
+
+def _last_chat_activity(user_id):
+    return select(func.max(Chat.last_message_at)).where(Chat.user_id == user_id).scalar_subquery()
+
+
+@event.listens_for(Session, "after_flush")
+def maintain_counters(session, flush_context):
+    added, removed = Counter(), Counter()
+    chats_added, chats_removed = Counter(), Counter()
+    deleted_chats = {}  # chat id -> user id
+
+    for obj in session.new:
+        if isinstance(obj, Message):
+            added[obj.chat_id] += 1
+        elif isinstance(obj, Chat):
+            chats_added[obj.user_id] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Message):
+            removed[obj.chat_id] += 1
+        elif isinstance(obj, Chat):
+            chats_removed[obj.user_id] += 1
+            deleted_chats[obj.id] = obj.user_id
+
+    if not (added or removed or chats_added or chats_removed):
+        return
+
+    conn = session.connection()
+    touched_users = set()
+
+    # Chat updates below pass updated_at through unchanged; otherwise its
+    # onupdate=now() would fire and reorder the chat list on counter changes
+
+    # now() is the transaction's start time, which is also the inserted rows' created_at
+    for chat_id, n in added.items():
+        conn.execute(update(Chat).where(Chat.id == chat_id).values(
+            message_count=Chat.message_count + n, last_message_at=func.now(),
+            updated_at=Chat.updated_at))
+        conn.execute(update(User).where(User.id == _user_of(chat_id)).values(
+            message_count=User.message_count + n, last_message_at=func.now()))
+
+    for chat_id, n in removed.items():
+        if chat_id in deleted_chats:
+            user_id = deleted_chats[chat_id]
+        else:
+            conn.execute(update(Chat).where(Chat.id == chat_id).values(
+                message_count=Chat.message_count - n, last_message_at=_last_message_at(chat_id),
+                updated_at=Chat.updated_at))
+            user_id = conn.scalar(select(Chat.user_id).where(Chat.id == chat_id))
+        conn.execute(update(User).where(User.id == user_id).values(
+            message_count=User.message_count - n))
+        touched_users.add(user_id)
+
+    for user_id in chats_added.keys() | chats_removed.keys():
+        n = chats_added[user_id] - chats_removed[user_id]
+        if n:
+            conn.execute(update(User).where(User.id == user_id).values(
+                chat_count=User.chat_count + n))
+    touched_users |= chats_removed.keys()
+
+    # Removing the newest message (or chat) moves last_message_at back
+    for user_id in touched_users:
+        conn.execute(update(User).where(User.id == user_id).values(
+            last_message_at=_last_chat_activity(user_id)))
+
+
+async def reconcile(db, user_id: int | None = None):
+    """Recompute the counters from messages and chats, for one user or everyone.
+
+    The caller commits.
+    """
+    chats = update(Chat).values(
+        message_count=select(func.count(Message.id)).where(Message.chat_id == Chat.id).scalar_subquery(),
+        last_message_at=_last_message_at(Chat.id),
+        updated_at=Chat.updated_at,
+    )
+    users = update(User).values(
+        chat_count=select(func.count(Chat.id)).where(Chat.user_id == User.id).scalar_subquery(),
+        message_count=select(func.coalesce(func.sum(Chat.message_count), 0))
+        .where(Chat.user_id == User.id).scalar_subquery(),
+        last_message_at=_last_chat_activity(User.id),
+    )
+    if user_id is not None:
+        chats = chats.where(Chat.user_id == user_id)
+        users = users.where(User.id == user_id)
+
+    await db.execute(chats)
+    await db.execute(users)
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        await reconcile(db)
+        await db.commit()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
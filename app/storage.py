@@ -0,0 +1,155 @@
+"""Content-addressed storage for uploaded files.
+
+Uploads are streamed to a temporary file in fixed-size chunks while their
+SHA-256 is computed, then moved to uploads/<sha[:2]>/<sha>. Identical
+content is therefore stored once; each chat references the blob through a
+"[file:<path>|<original name>]" message.
+"""
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from uuid import uuid4
+import anyio
+from fastapi import HTTPException, Request, UploadFile, status
+from fastapi.routing import APIRoute
+from .config import settings
+
+FILE_TAG_PREFIX = "[file:"
+SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+
+# Allowance for multipart boundaries and headers around the file in a request body
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+@dataclass
+class StoredFile:
+    path: str
+    filename: str
+    sha256: str
+    size: int
+
+
+def object_path(sha256: str) -> str:
+    return os.path.join(settings.upload_dir, sha256[:2], sha256)
+
+
+def _write_chunk(f, digest, chunk: bytes):
+    # Runs in a worker thread; hashlib releases the GIL on large buffers
+    digest.update(chunk)
+    f.write(chunk)
+
+
+def _commit(tmp_path: str, final_path: str) -> None:
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    if os.path.exists(final_path):
+        os.remove(tmp_path)  # Same content is already stored
+    else:
+        os.replace(tmp_path, final_path)
+
+
+def _discard(tmp_path: str) -> None:
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+async def save_upload(file: UploadFile) -> StoredFile:
+    """Stream `file` to disk without buffering it whole in memory."""
+    tmp_dir = os.path.join(settings.upload_dir, "tmp")
+    await anyio.to_thread.run_sync(lambda: os.makedirs(tmp_dir, exist_ok=True))
+    tmp_path = os.path.join(tmp_dir, uuid4().hex)
+
+    digest = hashlib.sha256()
+    size = 0
+    f = await anyio.to_thread.run_sync(open, tmp_path, "wb")
+    try:
+        try:
+            while chunk := await file.read(settings.upload_chunk_size):
+                size += len(chunk)
+                if size > settings.upload_max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File exceeds the {settings.upload_max_bytes} byte limit",
+                    )
+                await anyio.to_thread.run_sync(_write_chunk, f, digest, chunk)
+        finally:
+            await anyio.to_thread.run_sync(f.close)
+
+        sha256 = digest.hexdigest()
+        final_path = object_path(sha256)
+        await anyio.to_thread.run_sync(_commit, tmp_path, final_path)
+    except BaseException:
+        with anyio.CancelScope(shield=True):
+            await anyio.to_thread.run_sync(_discard, tmp_path)
+        raise
+
+    # The original name only travels inside the tag, so keep it tag-safe
+    filename = os.path.basename(file.filename or "").translate({ord("|"): "_", ord("]"): "_"})
+    return StoredFile(path=final_path, filename=filename or sha256, sha256=sha256, size=size)
+
+
+def file_tag(stored: StoredFile) -> str:
+    return f"{FILE_TAG_PREFIX}{stored.path}|{stored.filename}]"
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File exceeds the {settings.upload_max_bytes} byte limit",
+    )
+
+
+def check_content_length(content_length: str | None) -> None:
+    """Turn away a request whose declared body can't fit the upload limit."""
+    if content_length and content_length.isdigit() \
+            and int(content_length) > settings.upload_max_bytes + MULTIPART_OVERHEAD:
+        raise _too_large()
+
+
+class UploadLimitRoute(APIRoute):
+    """Enforces the upload limit while the request body is received.
+
+    FastAPI parses multipart bodies, spooling files to disk, before the
+    endpoint or its dependencies run, so the limit can't be checked there.
+    This route class rejects a too-large Content-Length before reading
+    anything, and counts the bytes of chunked bodies, which have none,
+    failing with 413 as soon as they pass the limit.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request):
+            check_content_length(request.headers.get("content-length"))
+            limit = settings.upload_max_bytes + MULTIPART_OVERHEAD
+            received = 0
+
+            async def receive():
+                nonlocal received
+                message = await request.receive()
+                if message["type"] == "http.request":
+                    received += len(message.get("body", b""))
+                    if received > limit:
+                        raise _too_large()
+                return message
+
+            return await handler(Request(request.scope, receive))
+
+        return limited_handler
+
+
+def parse_file_tag(content: str):
+    """Return (path, filename) for a file message, or None for other messages.
+
+    Anyone can send a message that looks like a tag, so only paths of
+    stored blobs (upload_dir/<sha[:2]>/<sha>) count; nothing else under
+    upload_dir, or outside it, can be reached through one.
+    """
+    if not content.startswith(FILE_TAG_PREFIX) or not content.endswith("]"):
+        return None
+    path, _, filename = content[len(FILE_TAG_PREFIX):-1].partition("|")
+    sha256 = os.path.basename(path)
+    if not SHA256_HEX.fullmatch(sha256) \
+            or os.path.realpath(path) != os.path.realpath(object_path(sha256)):
+        return None
+    return path, filename or sha256
@@ -0,0 +1,113 @@
+"""Server-side refresh-token store.
+
+Only SHA-256 digests of refresh tokens are kept. Two backends are provided:
+`MemoryTokenStore`, an in-process LRU for single-worker deployments, and
+`DatabaseTokenStore`, backed by the refresh_tokens table so every worker
+process shares the same state. `settings.refresh_token_store` picks one.
+"""
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from sqlalchemy import delete, select
+from . import models
+from .config import settings
+from .database import AsyncSessionLocal
+from .oauth2 import decode_token
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_expiry(token: str) -> datetime:
+    payload = decode_token(token) or {}
+    return datetime.fromtimestamp(payload.get("exp", 0), tz=timezone.utc)
+
+
+class TokenStore:
+    async def add(self, token: str, user_id: int):
+        raise NotImplementedError
+
+    async def is_active(self, token: str) -> bool:
+        """True if `token` was issued by us, has not expired and was not revoked."""
+        raise NotImplementedError
+
+    async def revoke_user(self, user_id: int):
+        """Revoke every refresh token held by `user_id`."""
+        raise NotImplementedError
+
+
+class MemoryTokenStore(TokenStore):
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._tokens = OrderedDict()  # digest -> (user_id, expires_at)
+
+    def _evict(self, now: datetime):
+        # Oldest entries sit at the front; drop the expired ones, then
+        # whatever exceeds the size bound
+        while self._tokens:
+            digest, (_, expires_at) = next(iter(self._tokens.items()))
+            if expires_at > now and len(self._tokens) <= self.max_size:
+                break
+            self._tokens.popitem(last=False)
+
+    async def add(self, token: str, user_id: int):
+        self._tokens[token_digest(token)] = (user_id, token_expiry(token))
+        self._evict(datetime.now(timezone.utc))
+
+    async def is_active(self, token: str) -> bool:
+        digest = token_digest(token)
+        entry = self._tokens.get(digest)
+        if entry is None:
+            return False
+        if entry[1] <= datetime.now(timezone.utc):
+            del self._tokens[digest]
+            return False
+        self._tokens.move_to_end(digest)
+        return True
+
+    async def revoke_user(self, user_id: int):
+        for digest in [d for d, (uid, _) in self._tokens.items() if uid == user_id]:
+            del self._tokens[digest]
+
+
+class DatabaseTokenStore(TokenStore):
+    async def add(self, token: str, user_id: int):
+        async with AsyncSessionLocal() as db:
+            # Expired tokens are pruned per user as new ones are issued
+            await db.execute(delete(models.RefreshToken).where(
+                models.RefreshToken.user_id == user_id,
+                models.RefreshToken.expires_at <= datetime.now(timezone.utc)
+            ))
+            db.add(models.RefreshToken(
+                token_hash=token_digest(token),
+                user_id=user_id,
+                expires_at=token_expiry(token),
+            ))
+            await db.commit()
+
+    async def is_active(self, token: str) -> bool:
+        async with AsyncSessionLocal() as db:
+            found = await db.scalar(select(models.RefreshToken.token_hash).where(
+                models.RefreshToken.token_hash == token_digest(token),
+                models.RefreshToken.expires_at > datetime.now(timezone.utc)
+            ))
+            return found is not None
+
+    async def revoke_user(self, user_id: int):
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(models.RefreshToken).where(
+                models.RefreshToken.user_id == user_id
+            ))
+            await db.commit()
+
+
+def build_store(name: str) -> TokenStore:
+    if name == "memory":
+        return MemoryTokenStore(settings.refresh_token_store_max_size)
+    if name == "database":
+        return DatabaseTokenStore()
+    raise ValueError(f"Unknown refresh token store '{name}'")
+
+
+store = build_store(settings.refresh_token_store)
@@ -1,29 +1,78 @@
+import asyncio
 import base64
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from passlib.context import CryptContext
-import requests
-import streamlit as st
+from . import hashing
+from .config import settings
+from .metrics import span
 
 # Backend API
 API_BASE = "http://localhost:8000"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Only used to check stored hashes against the configured cost; the hashing
+# itself runs in _hash_pool
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto",
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds,
+)
 
-def hash(password: str):
-    return pwd_context.hash(password)
+# bcrypt is CPU-bound and holds the GIL, so it runs in worker processes on
+# their own cores instead of the event loop or request threadpool
+_hash_pool = None
+_hash_slots = None
 
-def verify(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+def _pool():
+    global _hash_pool, _hash_slots
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(
+            max_workers=settings.password_hash_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        # Bounds the backlog so a login burst queues here, not in the pool
+        _hash_slots = asyncio.Semaphore(settings.password_hash_max_pending)
+    return _hash_pool
+
+async def _run_in_pool(fn, *args):
+    pool = _pool()
+    async with _hash_slots:
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+async def hash(password: str):
+    with span("bcrypt_hash"):
+        return await _run_in_pool(hashing.hash_password, password, settings.bcrypt_rounds)
+
+async def verify(plain_password, hashed_password):
+    with span("bcrypt_verify"):
+        return await _run_in_pool(hashing.verify_password, plain_password, hashed_password)
+
+def needs_update(hashed_password):
+    """True when a stored hash was made with a different bcrypt cost than configured."""
+    return pwd_context.needs_update(hashed_password)
+
+def shutdown_hash_pool():
+    global _hash_pool, _hash_slots
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = _hash_slots = None
 
 def get_base64_of_image(image_path):
     with open(image_path, "rb") as img_file:
         return base64.b64encode(img_file.read()).decode()
     
+# The helpers below serve the Streamlit client; streamlit and requests are
+# imported on use so the API server never loads them
+
 def load_css(file_name):
+    import streamlit as st
     with open(file_name) as f:
         st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
 # Login function
 def login(email, password):
+    import requests
+    import streamlit as st
     try:
         response = requests.post(f"{API_BASE}/login", json={"email": email, "password": password})
         response.raise_for_status()
@@ -37,6 +86,8 @@ def login(email, password):
 
 # Chat function (sends message to backend API with token)
 def send_message_to_backend(message):
+    import requests
+    import streamlit as st
     headers = {"Authorization": f"Bearer {st.session_state.access_token}"}
     try:
         response = requests.post(f"{API_BASE}/send", json={"message": message}, headers=headers)
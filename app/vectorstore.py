@@ -0,0 +1,145 @@
+"""Per-chat vector index of uploaded file chunks, held in NumPy arrays.
+
+Each chat's index is an (n, dim) float32 matrix of L2-normalized embeddings
+plus the chunk texts, persisted as <index_dir>/<chat_id>.npz. Cosine top-k
+search is a single matrix-vector product followed by argpartition.
+
+Workers share the files: updates hold an flock on <chat_id>.npz.lock while
+they read, extend and replace the index, so concurrent uploads to one chat
+from different processes don't overwrite each other.
+"""
+import asyncio
+import fcntl
+import os
+import tempfile
+from collections import defaultdict
+from contextlib import contextmanager, suppress
+import anyio
+import numpy as np
+from cachetools import LRUCache
+from .config import settings
+
+
+class ChatIndex:
+    def __init__(self, matrix=None, texts=None, sources=None):
+        self.matrix = matrix
+        self.texts = texts if texts is not None else np.array([], dtype=str)
+        self.sources = sources if sources is not None else np.array([], dtype=str)
+
+    def __len__(self):
+        return 0 if self.matrix is None else self.matrix.shape[0]
+
+    def has_source(self, source: str) -> bool:
+        return bool(np.any(self.sources == source))
+
+    def add(self, vectors, texts: list[str], source: str):
+        vectors = normalize(np.asarray(vectors, dtype=np.float32))
+        self.matrix = vectors if self.matrix is None else np.vstack([self.matrix, vectors])
+        self.texts = np.concatenate([self.texts, np.array(texts, dtype=str)])
+        self.sources = np.concatenate([self.sources, np.full(len(texts), source)])
+
+    def search(self, query_vector, k: int):
+        """Return [(score, text)] for the k chunks most similar to the query."""
+        if not len(self):
+            return []
+        query = normalize(np.asarray(query_vector, dtype=np.float32)[None, :])[0]
+        scores = self.matrix @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), str(self.texts[i])) for i in top]
+
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def index_path(chat_id: int) -> str:
+    return os.path.join(settings.index_dir, f"{chat_id}.npz")
+
+
+def _read(path: str):
+    if not os.path.exists(path):
+        return ChatIndex(), None
+    with np.load(path, allow_pickle=False) as data:
+        index = ChatIndex(data["matrix"], data["texts"], data["sources"])
+    return index, os.path.getmtime(path)
+
+
+def _write(path: str, index: ChatIndex):
+    # A temporary name of its own, so concurrent writers never share one
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=os.path.basename(path),
+                                     suffix=".tmp", delete=False) as f:
+        tmp_path = f.name
+        try:
+            np.savez(f, matrix=index.matrix, texts=index.texts, sources=index.sources)
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+    return os.path.getmtime(path)
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Hold an exclusive lock on the index at `path` across processes."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _add(path: str, vectors, texts: list[str], source: str):
+    # Re-read under the lock: another worker may have added to the file since we cached it
+    with _file_lock(path):
+        index, mtime = _read(path)
+        if index.has_source(source):
+            return False, index, mtime
+        index.add(vectors, texts, source)
+        return True, index, _write(path, index)
+
+
+def _remove(path: str):
+    with _file_lock(path):
+        if os.path.exists(path):
+            os.remove(path)
+    with suppress(FileNotFoundError):
+        os.remove(f"{path}.lock")
+
+
+# chat_id -> (ChatIndex, mtime of the file it was loaded from)
+_cache = LRUCache(maxsize=settings.index_cache_size)
+# Serializes this process's own writers, so they don't tie up threads waiting on the flock
+_locks = defaultdict(asyncio.Lock)
+
+
+async def load(chat_id: int) -> ChatIndex:
+    path = index_path(chat_id)
+    cached = _cache.get(chat_id)
+    if cached is not None:
+        # Another worker may have rewritten the file since we loaded it
+        mtime = await anyio.to_thread.run_sync(lambda: os.path.getmtime(path) if os.path.exists(path) else None)
+        if mtime == cached[1]:
+            return cached[0]
+    index, mtime = await anyio.to_thread.run_sync(_read, path)
+    _cache[chat_id] = (index, mtime)
+    return index
+
+
+async def add(chat_id: int, vectors, texts: list[str], source: str) -> bool:
+    """Append chunks from `source` to the chat's index; False if already indexed."""
+    async with _locks[chat_id]:
+        added, index, mtime = await anyio.to_thread.run_sync(_add, index_path(chat_id), vectors, texts, source)
+        _cache[chat_id] = (index, mtime)
+        return added
+
+
+async def drop(chat_id: int):
+    _cache.pop(chat_id, None)
+    await anyio.to_thread.run_sync(_remove, index_path(chat_id))
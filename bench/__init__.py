@@ -0,0 +1,8 @@
+"""Load and latency benchmarks; see bench/run.py."""
+
+# Credentials of the users created by bench.seed
+PASSWORD = "bench-password"
+
+
+def email(i: int) -> str:
+    return f"bench{i}@example.com"
@@ -0,0 +1,151 @@
+"""OpenAI- and Ollama-compatible stub backend for benchmarks.
+
+    python -m bench.fake_llm --port 11500 --latency 0.2 --tokens-per-second 50 --reply-tokens 40
+
+Serves /v1/chat/completions and /v1/embeddings (OpenAI) and /api/chat and
+/api/embed (Ollama), streaming or not. Every reply is `reply_tokens` words,
+sent after `latency` seconds and then paced at `tokens_per_second`, so runs
+are reproducible and the model's share of latency is known.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY = float(os.environ.get("FAKE_LLM_LATENCY", "0.2"))
+TOKENS_PER_SECOND = float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+REPLY_TOKENS = int(os.environ.get("FAKE_LLM_REPLY_TOKENS", "40"))
+EMBEDDING_DIM = 64
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+         "tempor incididunt ut labore et dolore magna aliqua").split()
+
+app = FastAPI()
+
+
+def reply_tokens() -> list[str]:
+    return [WORDS[i % len(WORDS)] + " " for i in range(REPLY_TOKENS)]
+
+
+def prompt_tokens(messages) -> int:
+    return sum(len(str(m.get("content", "")).split()) for m in messages)
+
+
+async def paced(tokens):
+    await asyncio.sleep(LATENCY)
+    for token in tokens:
+        yield token
+        if TOKENS_PER_SECOND:
+            await asyncio.sleep(1 / TOKENS_PER_SECOND)
+
+
+async def generate() -> str:
+    return "".join([token async for token in paced(reply_tokens())])
+
+
+def embedding(text: str) -> list[float]:
+    digest = hashlib.sha256(text.encode()).digest()
+    return [(digest[i % len(digest)] - 128) / 128 for i in range(EMBEDDING_DIM)]
+
+
+# OpenAI
+
+@app.post("/v1/chat/completions")
+async def openai_chat(request: Request):
+    body = await request.json()
+    model, messages = body.get("model", "fake"), body.get("messages", [])
+    completion_id, created = f"chatcmpl-{uuid.uuid4().hex}", int(time.time())
+    usage = {"prompt_tokens": prompt_tokens(messages), "completion_tokens": REPLY_TOKENS,
+             "total_tokens": prompt_tokens(messages) + REPLY_TOKENS}
+
+    def chunk(delta: dict, finish_reason=None, **extra) -> str:
+        data = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra}
+        return f"data: {json.dumps(data)}\n\n"
+
+    if body.get("stream"):
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            async for token in paced(reply_tokens()):
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return {
+        "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": await generate()},
+                     "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+@app.post("/v1/embeddings")
+async def openai_embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    return {
+        "object": "list", "model": body.get("model", "fake"),
+        "data": [{"object": "embedding", "index": i, "embedding": embedding(str(text))}
+                 for i, text in enumerate(inputs)],
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+# Ollama
+
+@app.post("/api/chat")
+async def ollama_chat(request: Request):
+    body = await request.json()
+    model, messages = body.get("model", "fake"), body.get("messages", [])
+
+    def message(content: str, done: bool) -> dict:
+        data = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "message": {"role": "assistant", "content": content}, "done": done}
+        if done:
+            data.update(done_reason="stop", prompt_eval_count=prompt_tokens(messages),
+                        eval_count=REPLY_TOKENS)
+        return data
+
+    if body.get("stream", True):
+        async def lines():
+            async for token in paced(reply_tokens()):
+                yield json.dumps(message(token, False)) + "\n"
+            yield json.dumps(message("", True)) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return JSONResponse(message(await generate(), True))
+
+
+@app.post("/api/embed")
+async def ollama_embed(request: Request):
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    return {"model": body.get("model", "fake"), "embeddings": [embedding(str(text)) for text in inputs]}
+
+
+def main():
+    global LATENCY, TOKENS_PER_SECOND, REPLY_TOKENS
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency", type=float, default=LATENCY, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=TOKENS_PER_SECOND)
+    parser.add_argument("--reply-tokens", type=int, default=REPLY_TOKENS)
+    args = parser.parse_args()
+    LATENCY, TOKENS_PER_SECOND, REPLY_TOKENS = args.latency, args.tokens_per_second, args.reply_tokens
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
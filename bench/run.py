@@ -0,0 +1,282 @@
+"""Drive the app at a fixed concurrency and report latency, throughput and cost.
+
+    python -m bench.run --concurrency 32 --duration 30 --save bench/baselines/default.json
+    python -m bench.run --compare bench/baselines/default.json
+
+Unless --url is given, this starts the fake LLM backend (bench.fake_llm)
+and the app (python -m app.start_server) with its LLM and embedding
+settings pointed at the stub, then seeds the database (bench.seed) unless
+--no-seed. The app uses its normal DATABASE_* settings, so point them at a
+disposable Postgres.
+
+For each scenario it reports requests/s, p50/p95/p99 latency and errors.
+It also reports SQL statements per request, scraped from /metrics, and the
+peak RSS of the server processes. --compare exits non-zero when p95 or
+throughput regresses by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+import httpx
+from . import PASSWORD, email
+
+SCENARIOS = ("login", "list_chats", "send", "continue")
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(p / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+class Scenario:
+    def __init__(self, name: str, route: str):
+        self.name = name
+        self.route = route  # route template, as labelled in /metrics
+        self.latencies = []
+        self.errors = 0
+
+    def report(self, elapsed: float) -> dict:
+        values = sorted(self.latencies)
+        return {
+            "requests": len(values),
+            "errors": self.errors,
+            "rps": len(values) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+
+
+async def request(client: httpx.AsyncClient, scenario: Scenario, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    if ok:
+        scenario.latencies.append(time.perf_counter() - started)
+    else:
+        scenario.errors += 1
+
+
+async def login(client: httpx.AsyncClient, i: int) -> dict:
+    response = await client.post("/login", json={"email": email(i), "password": PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def chat_ids(client: httpx.AsyncClient, headers: dict) -> list[int]:
+    response = await client.get("/chats", params={"limit": 100}, headers=headers)
+    response.raise_for_status()
+    return [chat["id"] for chat in response.json()["items"]]
+
+
+async def run_scenario(client, name: str, sessions, users: int, concurrency: int, duration: float) -> Scenario:
+    routes = {"login": "/login", "list_chats": "/chats", "send": "/send/{chat_id}",
+              "continue": "/chats/{chat_id}/continue"}
+    scenario = Scenario(name, routes[name])
+    deadline = time.monotonic() + duration
+
+    async def worker(n: int):
+        rng = random.Random(n)
+        while time.monotonic() < deadline:
+            i = rng.randrange(users)
+            headers, chats = sessions[i]
+            if name == "login":
+                await request(client, scenario, "POST", "/login",
+                              json={"email": email(i), "password": PASSWORD})
+            elif name == "list_chats":
+                await request(client, scenario, "GET", "/chats", headers=headers)
+            elif name == "send":
+                await request(client, scenario, "POST", f"/send/{rng.choice(chats)}",
+                              json={"message": "benchmark question"}, headers=headers)
+            else:
+                await request(client, scenario, "POST", f"/chats/{rng.choice(chats)}/continue",
+                              json={"message": "benchmark follow-up"}, headers=headers)
+
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return scenario
+
+
+def parse_metrics(text: str, name: str) -> dict:
+    """{route: value} for one route-labelled series of a Prometheus text dump."""
+    values = {}
+    for line in text.splitlines():
+        if line.startswith(name + "{"):
+            labels, value = line.rsplit(" ", 1)
+            route = labels.split('route="', 1)[1].split('"', 1)[0]
+            values[route] = float(value)
+    return values
+
+
+async def queries_per_request(client, before: str) -> dict:
+    after = (await client.get("/metrics")).text
+    sums = [parse_metrics(text, "db_queries_per_request_sum") for text in (before, after)]
+    counts = [parse_metrics(text, "db_queries_per_request_count") for text in (before, after)]
+    result = {}
+    for route, total in sums[1].items():
+        count = counts[1].get(route, 0) - counts[0].get(route, 0)
+        if count:
+            result[route] = (total - sums[0].get(route, 0)) / count
+    return result
+
+
+def peak_rss_mb(pid: int) -> float | None:
+    """Sum of VmHWM over `pid` and its descendants (Linux only)."""
+    def children(p):
+        try:
+            ids = Path(f"/proc/{p}/task/{p}/children").read_text().split()
+        except OSError:
+            return []
+        return [int(c) for c in ids]
+
+    total, stack = 0, [pid]
+    while stack:
+        p = stack.pop()
+        stack += children(p)
+        try:
+            for line in Path(f"/proc/{p}/status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    total += int(line.split()[1])
+        except OSError:
+            continue
+    return total / 1024 if total else None
+
+
+def start_servers(args) -> tuple[list[subprocess.Popen], subprocess.Popen]:
+    stub = subprocess.Popen([sys.executable, "-m", "bench.fake_llm", "--port", str(args.llm_port),
+                             "--latency", str(args.llm_latency),
+                             "--tokens-per-second", str(args.llm_tokens_per_second),
+                             "--reply-tokens", str(args.llm_reply_tokens)])
+    env = dict(os.environ,
+               SERVER_HOST="127.0.0.1", SERVER_PORT=str(args.port), SERVER_WORKERS=str(args.workers),
+               OPENAI_API_KEY="bench", OPENAI_BASE_URL=f"http://127.0.0.1:{args.llm_port}/v1",
+               OLLAMA_BASE_URL=f"http://127.0.0.1:{args.llm_port}", METRICS_ENABLED="true",
+               # Admission limits sized to the load, so the stub is measured rather than 429s
+               LLM_CONCURRENCY_PER_MODEL=str(args.llm_concurrency),
+               LLM_MAX_QUEUE_PER_USER=str(args.concurrency), LLM_MAX_QUEUE_PER_MODEL=str(args.concurrency))
+    app = subprocess.Popen([sys.executable, "-m", "app.start_server"], env=env)
+    return [stub, app], app
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/metrics")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("App did not become ready")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, now in results["scenarios"].items():
+        then = baseline.get("scenarios", {}).get(name)
+        if not then:
+            continue
+        if then["p95_ms"] and now["p95_ms"] > then["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {then['p95_ms']:.1f}ms -> {now['p95_ms']:.1f}ms")
+        if now["rps"] < then["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {then['rps']:.1f} -> {now['rps']:.1f}")
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"{'scenario':<12}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'queries':>9}")
+    for name, r in results["scenarios"].items():
+        queries = r.get("queries_per_request")
+        print(f"{name:<12}{r['rps']:>9.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+              f"{r['errors']:>8}{queries if queries is None else round(queries, 1):>9}")
+    if results.get("peak_rss_mb"):
+        print(f"peak RSS: {results['peak_rss_mb']:.0f} MiB")
+
+
+async def main(args):
+    processes, app = [], None
+    if not args.url:
+        if not args.no_seed:
+            subprocess.run([sys.executable, "-m", "bench.seed", "--users", str(args.users),
+                            "--chats-per-user", str(args.chats_per_user),
+                            "--messages-per-chat", str(args.messages_per_chat)], check=True)
+        processes, app = start_servers(args)
+
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+            await wait_ready(client)
+            sessions = []
+            for i in range(args.users):
+                headers = await login(client, i)
+                sessions.append((headers, await chat_ids(client, headers)))
+
+            results = {"config": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+                       "scenarios": {}}
+            for name in args.scenarios:
+                before = (await client.get("/metrics")).text
+                started = time.monotonic()
+                scenario = await run_scenario(client, name, sessions, args.users, args.concurrency, args.duration)
+                report = scenario.report(time.monotonic() - started)
+                report["queries_per_request"] = (await queries_per_request(client, before)).get(scenario.route)
+                results["scenarios"][name] = report
+
+            if app is not None:
+                results["peak_rss_mb"] = peak_rss_mb(app.pid)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=120)
+
+    print_table(results)
+
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save).write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        return 1 if regressions else 0
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="benchmark an already running app instead of starting one")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20, help="seconds per scenario")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--chats-per-user", type=int, default=20)
+    parser.add_argument("--messages-per-chat", type=int, default=40)
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--llm-port", type=int, default=11500)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50)
+    parser.add_argument("--llm-reply-tokens", type=int, default=40)
+    parser.add_argument("--llm-concurrency", type=int, default=64, help="admission slots per model")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,88 @@
+"""Seed the configured database with benchmark users, chats and messages.
+
+    python -m bench.seed --users 50 --chats-per-user 20 --messages-per-chat 40
+
+Users are bench{i}@example.com with password bench.PASSWORD. Earlier bench data is
+removed first, so runs start from the same state. Uses the app's own
+database settings (DATABASE_* in the environment or .env).
+"""
+import argparse
+import asyncio
+import datetime
+import time
+from sqlalchemy import delete, insert, select
+from app import hashing, models
+from app.config import settings
+from app.database import AsyncSessionLocal, Base, engine
+from app.stats import reconcile
+from . import PASSWORD, email
+
+EMAIL_PATTERN = "bench%@example.com"
+BATCH = 1000
+
+
+def message_text(i: int, chars: int) -> str:
+    words = f"benchmark message {i} about retrieval context windows and token budgets "
+    return (words * (chars // len(words) + 1))[:chars]
+
+
+async def clear(db):
+    bench_users = select(models.User.id).where(models.User.email.like(EMAIL_PATTERN))
+    bench_chats = select(models.Chat.id).where(models.Chat.user_id.in_(bench_users))
+    await db.execute(delete(models.Message).where(models.Message.chat_id.in_(bench_chats)))
+    await db.execute(delete(models.Chat).where(models.Chat.user_id.in_(bench_users)))
+    await db.execute(delete(models.User).where(models.User.email.like(EMAIL_PATTERN)))
+
+
+async def seed(users: int, chats_per_user: int, messages_per_chat: int, message_chars: int):
+    Base.metadata.create_all(bind=engine)
+    # One hash for everyone; at the configured cost, so /login measures the real thing
+    password = hashing.hash_password(PASSWORD, settings.bcrypt_rounds)
+    start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=30)
+
+    async with AsyncSessionLocal() as db:
+        await clear(db)
+        user_ids = (await db.scalars(insert(models.User).returning(models.User.id),
+                                     [{"email": email(i), "password": password} for i in range(users)])).all()
+
+        for user_id in user_ids:
+            chat_ids = (await db.scalars(insert(models.Chat).returning(models.Chat.id), [
+                {"user_id": user_id, "title": f"Bench chat {c}"} for c in range(chats_per_user)
+            ])).all()
+
+            rows = []
+            for chat_id in chat_ids:
+                for m in range(messages_per_chat):
+                    rows.append({
+                        "chat_id": chat_id,
+                        "sender": "user" if m % 2 == 0 else "assistant",
+                        "content": message_text(m, message_chars),
+                        "created_at": start + datetime.timedelta(minutes=m),
+                    })
+                    if len(rows) >= BATCH:
+                        await db.execute(insert(models.Message).values(rows))
+                        rows = []
+            if rows:
+                await db.execute(insert(models.Message).values(rows))
+
+        await reconcile(db)
+        await db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--chats-per-user", type=int, default=20)
+    parser.add_argument("--messages-per-chat", type=int, default=40)
+    parser.add_argument("--message-chars", type=int, default=400)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    asyncio.run(seed(args.users, args.chats_per_user, args.messages_per_chat, args.message_chars))
+    total = args.users * args.chats_per_user * args.messages_per_chat
+    print(f"Seeded {args.users} users, {args.users * args.chats_per_user} chats and "
+          f"{total} messages in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
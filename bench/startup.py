@@ -0,0 +1,136 @@
+"""Measure how long a worker takes to start and how much memory it holds.
+
+    python -m bench.startup --runs 5
+    python -m bench.startup --runs 5 --warm-up --serve --workers 2
+
+Each run imports app.main in a fresh interpreter and reports the import
+time, resident memory afterwards, and which heavy packages the import
+alone loaded. --warm-up also runs the app's warm-up hook (settings.warm_up)
+to show its cost. --serve then starts python -m app.start_server and
+reports the time until /metrics answers and the RSS of the launcher and
+each worker; that needs DATABASE_* to point at a reachable Postgres.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+import httpx
+
+HEAVY = ("streamlit", "requests", "openai", "langchain_openai", "langchain_ollama",
+         "langchain_text_splitters", "tiktoken", "numpy")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter() - started
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024
+
+result = {"import_s": imported, "rss_mb": rss_mb(), "loaded": [m for m in HEAVY if m in sys.modules]}
+if WARM_UP:
+    started = time.perf_counter()
+    app.main.warm_up()
+    result["warm_up_s"] = time.perf_counter() - started
+    result["warm_rss_mb"] = rss_mb()
+print(json.dumps(result))
+"""
+
+
+def probe(warm_up: bool) -> dict:
+    code = f"WARM_UP = {warm_up!r}\nHEAVY = {HEAVY!r}\n" + PROBE
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def rss_mb(pid: int) -> float | None:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def workers_of(pid: int) -> list[int]:
+    try:
+        return [int(c) for c in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
+    except OSError:
+        return []
+
+
+def serve(port: int, workers: int, warm_up: bool, timeout: float = 120) -> dict:
+    env = dict(os.environ, SERVER_HOST="127.0.0.1", SERVER_PORT=str(port),
+               SERVER_WORKERS=str(workers), WARM_UP=str(warm_up).lower())
+    started = time.perf_counter()
+    app = subprocess.Popen([sys.executable, "-m", "app.start_server"], env=env)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if app.poll() is not None:
+                raise RuntimeError(f"app.start_server exited with {app.returncode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError("App did not become ready")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        ready = time.perf_counter() - started
+        # Every worker has to finish its own start-up before it counts
+        time.sleep(2)
+        children = workers_of(app.pid)
+        return {"ready_s": ready, "launcher_rss_mb": rss_mb(app.pid),
+                "worker_rss_mb": [rss_mb(pid) for pid in children]}
+    finally:
+        app.terminate()
+        app.wait(timeout=120)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warm-up", action="store_true", help="also time the app's warm-up hook")
+    parser.add_argument("--serve", action="store_true", help="also start the server and time readiness")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    runs = [probe(args.warm_up) for _ in range(args.runs)]
+    results = {
+        "import_s": statistics.median(r["import_s"] for r in runs),
+        "rss_mb": statistics.median(r["rss_mb"] for r in runs),
+        "loaded": runs[-1]["loaded"],
+    }
+    if args.warm_up:
+        results["warm_up_s"] = statistics.median(r["warm_up_s"] for r in runs)
+        results["warm_rss_mb"] = statistics.median(r["warm_rss_mb"] for r in runs)
+    if args.serve:
+        results["serve"] = serve(args.port, args.workers, args.warm_up)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"import app.main: {results['import_s']:.2f}s median of {args.runs}, RSS {results['rss_mb']:.0f} MiB")
+    if args.warm_up:
+        print(f"warm-up:         {results['warm_up_s']:.2f}s, RSS {results['warm_rss_mb']:.0f} MiB after")
+    print(f"loaded by import: {', '.join(results['loaded']) or 'none of ' + ', '.join(HEAVY)}")
+    if args.serve:
+        s = results["serve"]
+        print(f"ready after:     {s['ready_s']:.2f}s with {args.workers} workers")
+        print(f"launcher RSS:    {s['launcher_rss_mb']:.0f} MiB")
+        for i, rss in enumerate(s["worker_rss_mb"]):
+            print(f"worker {i} RSS:    {rss:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
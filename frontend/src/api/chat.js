@@ -17,10 +17,14 @@ export const sendMessage = async (chatId, message) => {
     return res.data;
   };
 
-  export const fetchChats = async () => {
+  // One page of chat summaries: { items, next_cursor }
+  export const fetchChatPage = async (cursor = null, limit = 50) => {
     const token = localStorage.getItem("access_token");
 
-    const res = await fetch(`${API_BASE}/chats`, {
+    const params = new URLSearchParams({ limit });
+    if (cursor) params.set("cursor", cursor);
+
+    const res = await fetch(`${API_BASE}/chats?${params}`, {
         headers: {
         Authorization: `Bearer ${token}`,
       },
@@ -31,6 +35,54 @@ export const sendMessage = async (chatId, message) => {
     return res.json();
   };
 
+  // Every chat summary, newest first, following next_cursor until the last page
+  export const fetchChats = async () => {
+    const chats = [];
+    let cursor = null;
+    do {
+      const page = await fetchChatPage(cursor, 100);
+      chats.push(...page.items);
+      cursor = page.next_cursor;
+    } while (cursor);
+    return chats;
+  };
+
+  // Full-text search over the user's messages, best match first: { items, next_cursor }
+  export const searchMessages = async (q, cursor = null, limit = 20) => {
+    const token = localStorage.getItem("access_token");
+
+    const params = new URLSearchParams({ q, limit });
+    if (cursor) params.set("cursor", cursor);
+
+    const res = await fetch(`${API_BASE}/search?${params}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    });
+
+    if (!res.ok) throw new Error("Search failed");
+
+    return res.json();
+  };
+
+  // Older messages of a chat, oldest first: { items, next_before }
+  export const fetchMessages = async (chatId, before = null, limit = 50) => {
+    const token = localStorage.getItem("access_token");
+
+    const params = new URLSearchParams({ limit });
+    if (before) params.set("before", before);
+
+    const res = await fetch(`${API_BASE}/chats/${chatId}/messages?${params}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    });
+
+    if (!res.ok) throw new Error(`Failed to fetch messages for chat ${chatId}`);
+
+    return res.json();
+  };
+
 export const fetchChat = async (chatId) => {
     const token = localStorage.getItem("access_token");
 
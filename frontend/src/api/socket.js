@@ -0,0 +1,87 @@
+// const WS_BASE = "ws://localhost:8000";
+const WS_BASE = "wss://chatbot-9hch.onrender.com"; // your Render URL
+
+// One socket for every chat on the page. Replies stream in as "token" frames
+// tagged with the request id; after a reconnect each open chat is synced from
+// the last message id it saw instead of reloading its history. The token goes
+// in the first frame rather than the URL, which proxies and servers log.
+export function openChatSocket({ onFrame, onStatus } = {}) {
+  let ws = null;
+  let closed = false;
+  let retryDelay = 1000;
+  let nextId = 1;
+  const lastSeen = {}; // chatId -> last message id received
+
+  const track = (frame) => {
+    if (frame.type === "start" && frame.user_message_id) {
+      lastSeen[frame.chat_id] = Math.max(lastSeen[frame.chat_id] || 0, frame.user_message_id);
+    }
+    if (frame.type === "done" && frame.message_id) {
+      lastSeen[frame.chat_id] = Math.max(lastSeen[frame.chat_id] || 0, frame.message_id);
+    }
+    if (frame.type === "messages" && frame.items.length) {
+      lastSeen[frame.chat_id] = frame.items[frame.items.length - 1].id;
+    }
+  };
+
+  // False when the socket isn't open and the frame was not sent
+  const send = (frame) => {
+    if (ws && ws.readyState === WebSocket.OPEN) {
+      ws.send(JSON.stringify(frame));
+      return true;
+    }
+    return false;
+  };
+
+  const connect = () => {
+    ws = new WebSocket(`${WS_BASE}/ws`);
+
+    ws.onopen = () => {
+      retryDelay = 1000;
+      send({ type: "auth", token: localStorage.getItem("access_token") });
+      onStatus?.("open");
+      for (const chatId of Object.keys(lastSeen)) {
+        send({ type: "sync", id: `sync-${nextId++}`, chat_id: Number(chatId), after_id: lastSeen[chatId] });
+      }
+    };
+
+    ws.onmessage = (event) => {
+      const frame = JSON.parse(event.data);
+      if (frame.type === "ping") {
+        send({ type: "pong" });
+        return;
+      }
+      track(frame);
+      onFrame?.(frame);
+    };
+
+    ws.onclose = (event) => {
+      onStatus?.("closed");
+      // 1008: the token was rejected, so retrying won't help until the user logs in again
+      if (!closed && event.code !== 1008) {
+        setTimeout(connect, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, 30000);
+      }
+    };
+  };
+
+  connect();
+
+  // The request id replies are tagged with, or null if the socket is down
+  const request = (type, chatId, fields = {}) => {
+    const id = nextId++;
+    return send({ type, id, chat_id: chatId, ...fields }) ? id : null;
+  };
+
+  return {
+    send: (chatId, message, model) => request("send", chatId, { message, model }),
+    continueChat: (chatId, message, model) => request("continue", chatId, { message, model }),
+    regenerate: (chatId, model) => request("regenerate", chatId, { model }),
+    sync: (chatId, afterId = 0) => request("sync", chatId, { after_id: afterId }),
+    cancel: (id) => send({ type: "cancel", id }),
+    close: () => {
+      closed = true;
+      ws?.close();
+    },
+  };
+}
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { sendMessage, createChat, fetchChats, fetchChat, deleteChat, updateChat, fileUpload } from '../api/chat';
+import { openChatSocket } from '../api/socket';
 
 export default function OpenWebUIClone() {
   const [messages, setMessages] = useState([]);
@@ -17,6 +18,62 @@ export default function OpenWebUIClone() {
   const [editingChatId, setEditingChatId] = useState(null);
   const [editingTitle, setEditingTitle] = useState("");
 
+  // Replies stream over one WebSocket; pendingRef maps request id -> chat id
+  const socketRef = useRef(null);
+  const pendingRef = useRef({});
+
+  const handleFrame = (frame) => {
+    const chatId = frame.type === "messages" ? frame.chat_id : pendingRef.current[frame.id];
+    const isCurrent = chatId !== undefined && chatId === chatIdRef.current;
+
+    if (frame.type === "token" && isCurrent) {
+      setMessages((prev) => {
+        const last = prev[prev.length - 1];
+        if (last?.requestId === frame.id) {
+          return [...prev.slice(0, -1), { ...last, text: last.text + frame.delta }];
+        }
+        return [...prev, { from: "assistant", text: frame.delta, requestId: frame.id }];
+      });
+    } else if (frame.type === "done" || frame.type === "error" || frame.type === "cancelled") {
+      delete pendingRef.current[frame.id];
+      setIsLoading(false);
+      if (!isCurrent) return;
+      const text = frame.type === "done" ? frame.reply : frame.type === "error" ? `Error: ${frame.detail}` : null;
+      setMessages((prev) => {
+        const rest = prev.filter((msg) => msg.requestId !== frame.id);
+        return text === null ? rest : [...rest, { from: "assistant", text }];
+      });
+    } else if (frame.type === "messages" && isCurrent && frame.items.length) {
+      // Messages saved while the socket was down, e.g. a reply that finished meanwhile
+      setMessages((prev) => [
+        ...prev,
+        ...frame.items.map((msg) => ({ from: msg.sender === "user" ? "user" : "assistant", text: msg.content })),
+      ]);
+    }
+  };
+
+  const handleSocketStatus = (status) => {
+    if (status !== "closed") return;
+    // Replies in flight are lost with the connection; the reconnect's sync brings back what was saved
+    const requestIds = Object.keys(pendingRef.current).map(Number);
+    pendingRef.current = {};
+    setMessages((prev) => prev.filter((msg) => !requestIds.includes(msg.requestId)));
+    setIsLoading(false);
+  };
+
+  // Latest handlers for the socket, which is opened once
+  const frameHandlerRef = useRef(handleFrame);
+  frameHandlerRef.current = handleFrame;
+
+  useEffect(() => {
+    if (!localStorage.getItem("access_token")) return;
+    const socket = openChatSocket({
+      onFrame: (frame) => frameHandlerRef.current(frame),
+      onStatus: handleSocketStatus,
+    });
+    socketRef.current = socket;
+    return () => socket.close();
+  }, []);
 
   // Load chat history on component mount
   useEffect(() => {
@@ -76,14 +133,21 @@ export default function OpenWebUIClone() {
         setChatHistory(updatedChats);
       }
   
+      // Stream the reply over the socket; fall back to HTTP while it's reconnecting
+      const requestId = socketRef.current?.send(chatId, input);
+      if (requestId != null) {
+        pendingRef.current[requestId] = chatId;
+        return; // isLoading is cleared by the "done" or "error" frame
+      }
+
       const reply = await sendMessage(chatId, input);
       console.log("Received reply:", reply);
       setMessages((prev) => [...prev, { from: "assistant", text: reply.reply }]);
+      setIsLoading(false);
     } catch (err) {
       console.error("Failed to send message:", err);
-      handleLogout(); // Logout if there's an error
-    } finally {
       setIsLoading(false);
+      handleLogout(); // Logout if there's an error
     }
   };
 
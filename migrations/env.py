@@ -0,0 +1,46 @@
+"""Alembic environment: migrates the database named by the app's DATABASE_* settings.
+
+Indexes on large tables are built with CREATE INDEX CONCURRENTLY inside
+op.get_context().autocommit_block(), so migrations don't block writes while
+they run. Concurrent `alembic upgrade` runs (say, two deploys at once) wait
+for each other on an advisory lock.
+"""
+from alembic import context
+from sqlalchemy import create_engine, pool, text
+from app.database import DATABASE_URL, Base
+from app import models  # noqa: F401  registers the tables on Base.metadata
+
+# Any constant works; it only has to be the same for every run
+MIGRATION_LOCK_ID = 0x6d696772
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    """Emit SQL to stdout instead of running it: alembic upgrade head --sql"""
+    context.configure(url=DATABASE_URL, target_metadata=target_metadata,
+                      literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = create_engine(DATABASE_URL, poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        # Session-level, so it survives the commits of autocommit blocks
+        connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        connection.commit()
+        try:
+            context.configure(connection=connection, target_metadata=target_metadata)
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+            connection.commit()
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,96 @@
+"""Columns and tables added since the baseline
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+Adds the rolling summary and denormalized counters, messages.search_vector,
+and the refresh_tokens, jobs and completion_cache tables, then backfills the
+counters (the same numbers `python -m app.stats` recomputes). Their indexes
+are built concurrently in 0003.
+
+Adding search_vector rewrites `messages` under an exclusive lock, since a
+stored generated column has to be computed for every existing row. On a
+large table, run this revision in a quiet window.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Must match models.SEARCH_CONFIG at the time of this revision
+SEARCH_CONFIG = "english"
+
+
+def upgrade():
+    for table in ("users", "chats"):
+        op.add_column(table, sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"),
+                      if_not_exists=True)
+        op.add_column(table, sa.Column("last_message_at", sa.DateTime(timezone=True)), if_not_exists=True)
+    op.add_column("users", sa.Column("chat_count", sa.Integer(), nullable=False, server_default="0"),
+                  if_not_exists=True)
+    op.add_column("chats", sa.Column("summary", sa.Text()), if_not_exists=True)
+    op.add_column("chats", sa.Column("summary_message_id", sa.Integer()), if_not_exists=True)
+    op.add_column("messages", sa.Column(
+        "search_vector", TSVECTOR(),
+        sa.Computed(f"to_tsvector('{SEARCH_CONFIG}', content)", persisted=True),
+    ), if_not_exists=True)
+
+    op.create_table(
+        "refresh_tokens",
+        sa.Column("token_hash", sa.String(64), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.String(32), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("chat_id", sa.Integer(), sa.ForeignKey("chats.id", ondelete="CASCADE")),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("model", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("result", sa.JSON()),
+        sa.Column("error", sa.Text()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        if_not_exists=True,
+    )
+    op.create_table(
+        "completion_cache",
+        sa.Column("key", sa.String(64), primary_key=True),
+        sa.Column("model", sa.String(), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        if_not_exists=True,
+    )
+
+    op.execute("""
+        UPDATE chats SET message_count = s.n, last_message_at = s.last
+        FROM (SELECT chat_id, count(*) AS n, max(created_at) AS last FROM messages GROUP BY chat_id) AS s
+        WHERE chats.id = s.chat_id
+    """)
+    op.execute("""
+        UPDATE users SET chat_count = s.chats, message_count = s.messages, last_message_at = s.last
+        FROM (SELECT user_id, count(*) AS chats, sum(message_count) AS messages,
+                     max(last_message_at) AS last
+              FROM chats GROUP BY user_id) AS s
+        WHERE users.id = s.user_id
+    """)
+
+
+def downgrade():
+    op.drop_table("completion_cache")
+    op.drop_table("jobs")
+    op.drop_table("refresh_tokens")
+    op.drop_column("messages", "search_vector")
+    for column in ("summary_message_id", "summary", "last_message_at", "message_count"):
+        op.drop_column("chats", column)
+    for column in ("chat_count", "last_message_at", "message_count"):
+        op.drop_column("users", column)
@@ -0,0 +1,59 @@
+"""Foreign-key and query indexes, built without blocking writes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+Every index here is built with CREATE INDEX CONCURRENTLY, outside a
+transaction, so chats and messages stay writable while it runs. A
+concurrent build that fails leaves an INVALID index behind; it is dropped
+and rebuilt on the next run instead of being mistaken for a finished one.
+
+The composite indexes lead with the foreign key, so they also serve the
+messages.chat_id and chats.user_id lookups, including the ones Postgres
+makes when a parent row is deleted. A separate single-column index would
+only add write cost.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# name, table, columns, index method
+INDEXES = [
+    ("ix_chats_user_id_updated_at", "chats", ["user_id", "updated_at"], None),
+    ("ix_messages_chat_id_created_at", "messages", ["chat_id", "created_at"], None),
+    ("ix_messages_search_vector", "messages", ["search_vector"], "gin"),
+    ("ix_refresh_tokens_user_id", "refresh_tokens", ["user_id"], None),
+    ("ix_jobs_user_id", "jobs", ["user_id"], None),
+    ("ix_jobs_chat_id", "jobs", ["chat_id"], None),
+    ("ix_completion_cache_created_at", "completion_cache", ["created_at"], None),
+]
+
+
+def drop_if_invalid(name: str):
+    if op.get_context().as_sql:
+        return
+    invalid = op.get_bind().scalar(sa.text(
+        "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name"
+    ), {"name": name})
+    if invalid:
+        op.drop_index(name, postgresql_concurrently=True, if_exists=True)
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, using in INDEXES:
+            drop_if_invalid(name)
+            op.create_index(name, table, columns, postgresql_using=using,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,26 @@
+"""Job owner and lease, so a starting worker only fails orphaned jobs
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+Pending jobs from before this revision have no lease and are treated as
+orphaned.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("jobs", sa.Column("owner", sa.String(32)), if_not_exists=True)
+    op.add_column("jobs", sa.Column("lease_expires_at", sa.DateTime(timezone=True)), if_not_exists=True)
+
+
+def downgrade():
+    op.drop_column("jobs", "lease_expires_at")
+    op.drop_column("jobs", "owner")
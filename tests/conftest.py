@@ -0,0 +1,105 @@
+"""Run the app against a throwaway SQLite database and a scripted LLM.
+
+The app's own engines point at Postgres; tests swap the session
+dependencies (and the session factories modules open themselves) for ones
+bound to `engine` below, so requests go through the real routers, schemas
+and queries without a database server.
+"""
+import os
+
+for name, value in dict(DATABASE_HOSTNAME="localhost", DATABASE_PORT="5432", DATABASE_PASSWORD="test",
+                        DATABASE_NAME="test", DATABASE_USERNAME="test", SECRET_KEY="test",
+                        ALGORITHM="HS256", ACCESS_TOKEN_EXPIRE_MINUTES="30",
+                        REFRESH_TOKEN_EXPIRE_DAYS="7").items():
+    os.environ.setdefault(name, value)
+
+import importlib
+import httpx
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+from app import models
+from app.database import Base, get_db
+from app.llm import registry
+from app.main import app
+from app.oauth2 import create_access_token, token_claims
+from app.replicas import get_read_db
+
+
+@compiles(TSVECTOR, "sqlite")
+def compile_tsvector(type_, compiler, **kw):
+    return "TEXT"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+
+    # messages.search_vector is generated with to_tsvector(); a plain
+    # lowercase copy is enough to create and fill the table
+    @event.listens_for(engine.sync_engine, "connect")
+    def register_functions(conn, record):
+        conn.create_function("to_tsvector", 2, lambda config, text: (text or "").lower(), deterministic=True)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+# Modules that open sessions outside a request's dependencies
+SESSION_USERS = ("app.replies", "app.stats", "app.jobs", "app.tokens", "app.completion_cache",
+                 "app.routers.backup", "app.routers.ws")
+
+
+@pytest.fixture
+def sessions(engine, monkeypatch):
+    sessions = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    for module in SESSION_USERS:
+        monkeypatch.setattr(importlib.import_module(module), "AsyncSessionLocal", sessions)
+    return sessions
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    """Replies every model gives, in order; append to script a conversation."""
+    replies = []
+    monkeypatch.setattr(registry, "_clients", {})
+    monkeypatch.setattr(registry, "_build",
+                        lambda provider, model: GenericFakeChatModel(messages=iter(replies)))
+    return replies
+
+
+@pytest.fixture
+async def client(sessions):
+    async def get_test_db():
+        async with sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = get_test_db
+    app.dependency_overrides[get_read_db] = get_test_db
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+async def user(sessions):
+    async with sessions() as db:
+        user = models.User(email="test@example.com", password="not a hash")
+        db.add(user)
+        await db.commit()
+    return user
+
+
+@pytest.fixture
+def auth(user):
+    return {"Authorization": f"Bearer {create_access_token(token_claims(user))}"}
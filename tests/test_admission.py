@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.admission import ModelGate
+
+pytestmark = pytest.mark.anyio
+
+
+def make_gate(**limits) -> ModelGate:
+    return ModelGate(**{"capacity": 1, "max_queue": 8, "max_queue_per_user": 4,
+                        "queue_timeout": 5.0, **limits})
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_waiting_users_are_served_round_robin():
+    gate = make_gate()
+    await gate.acquire(user_id=1)
+    order = []
+
+    async def call(user_id, label):
+        async with gate.slot(user_id):
+            order.append(label)
+
+    # User 1 queues three calls before user 2 queues one
+    tasks = [asyncio.create_task(call(1, "a1")), asyncio.create_task(call(1, "a2")),
+             asyncio.create_task(call(1, "a3"))]
+    await settle()
+    tasks.append(asyncio.create_task(call(2, "b1")))
+    await settle()
+    assert gate.queued == 4
+
+    gate.release()
+    await asyncio.gather(*tasks)
+    assert order == ["a1", "b1", "a2", "a3"]
+    assert gate.in_flight == 0 and gate.queued == 0
+
+
+async def test_full_user_queue_is_rejected_with_retry_after():
+    gate = make_gate(max_queue_per_user=1)
+    await gate.acquire(user_id=1)
+    waiting = asyncio.create_task(gate.acquire(user_id=1))
+    await settle()
+
+    with pytest.raises(HTTPException) as e:
+        await gate.acquire(user_id=1)
+    assert e.value.status_code == 429
+    assert int(e.value.headers["Retry-After"]) >= 1
+
+    # Another user still gets a place in the queue
+    other = asyncio.create_task(gate.acquire(user_id=2))
+    await settle()
+    assert gate.queued == 2
+
+    gate.release()
+    await waiting
+    gate.release()
+    await other
+    assert gate.rejected == 1
+
+
+async def test_full_model_queue_is_rejected():
+    gate = make_gate(max_queue=1)
+    await gate.acquire(user_id=1)
+    waiting = asyncio.create_task(gate.acquire(user_id=1))
+    await settle()
+
+    with pytest.raises(HTTPException) as e:
+        gate.check(user_id=2)
+    assert e.value.status_code == 503
+    assert "Retry-After" in e.value.headers
+
+    gate.release()
+    await waiting
+
+
+async def test_bounded_wait_times_out_with_503():
+    gate = make_gate(queue_timeout=0.05)
+    await gate.acquire(user_id=1)
+
+    with pytest.raises(HTTPException) as e:
+        await gate.acquire(user_id=2)
+    assert e.value.status_code == 503
+    assert "Retry-After" in e.value.headers
+    assert gate.timed_out == 1
+    # The abandoned waiter leaves the queue, so the next caller goes straight in
+    assert gate.queued == 0
+    gate.release()
+    await gate.acquire(user_id=2)
+    assert gate.in_flight == 1
+
+
+async def test_unbounded_callers_skip_limits_and_timeout():
+    gate = make_gate(max_queue=1, max_queue_per_user=1, queue_timeout=0.01)
+    await gate.acquire(user_id=1)
+    jobs = [asyncio.create_task(gate.acquire(user_id=1, bounded=False)) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    assert gate.queued == 3 and not any(job.done() for job in jobs)
+
+    for job in jobs:
+        gate.release()
+        await job
+    assert gate.timed_out == 0 and gate.rejected == 0
@@ -0,0 +1,94 @@
+import datetime
+import json
+import pytest
+import zstandard
+from app import models
+from app.config import settings
+from app.oauth2 import create_access_token, token_claims
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_import_chat_without_title(client, auth):
+    lines = [
+        {"type": "chat", "id": 7, "created_at": "2024-01-01T00:00:00+00:00",
+         "updated_at": "2024-01-01T00:00:00+00:00"},
+        {"type": "message", "chat_id": 7, "sender": "user", "content": "hi",
+         "created_at": "2024-01-01T00:00:00+00:00"},
+    ]
+    response = await client.post("/import", headers=auth,
+                                 content="\n".join(json.dumps(line) for line in lines))
+    assert response.json() == {"chats": 1, "messages": 1}
+
+    [chat] = (await client.get("/chats", headers=auth)).json()["items"]
+    assert chat["title"] == "New Chat"
+    assert (await client.get(f"/chats/{chat['id']}", headers=auth)).status_code == 200
+
+
+async def test_import_zstd_bomb(client, auth, monkeypatch):
+    monkeypatch.setattr(settings, "import_max_bytes", 1024 * 1024)
+    body = zstandard.ZstdCompressor().compress(b"\n" * (64 * 1024 * 1024))
+    assert len(body) < 16 * 1024
+    response = await client.post("/import", headers=auth, content=body)
+    assert response.status_code == 413
+
+
+async def test_import_line_too_long(client, auth, monkeypatch):
+    monkeypatch.setattr(settings, "import_max_line_bytes", 1024)
+    response = await client.post("/import", headers=auth, content=b"x" * 4096)
+    assert response.status_code == 413
+
+
+async def test_import_zstd(client, auth):
+    line = {"type": "chat", "id": 1, "title": "Zipped", "created_at": "2024-01-01T00:00:00+00:00",
+            "updated_at": "2024-01-01T00:00:00+00:00"}
+    body = zstandard.ZstdCompressor().compress(json.dumps(line).encode())
+    response = await client.post("/import", headers=auth, content=body)
+    assert response.json() == {"chats": 1, "messages": 0}
+
+
+@pytest.mark.parametrize("compression", [None, "zstd"])
+async def test_export_round_trip(client, auth, sessions, user, monkeypatch, compression):
+    # Small pages, so the export crosses page boundaries for chats and messages
+    monkeypatch.setattr(settings, "bulk_batch_size", 2)
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    async with sessions() as db:
+        chats = [models.Chat(user_id=user.id, title=f"Chat {i}", created_at=start, updated_at=start)
+                 for i in range(3)]
+        db.add_all(chats)
+        await db.flush()
+        db.add_all(models.Message(chat_id=chats[i].id, sender="user", content=f"message {i}.{j}",
+                                  created_at=start + datetime.timedelta(seconds=j))
+                   for i in (0, 2) for j in range(3))
+        await db.commit()
+
+    params = {"compression": compression} if compression else {}
+    exported = (await client.get("/export", headers=auth, params=params)).content
+    lines = [json.loads(line) for line in export_text(exported, compression).splitlines()]
+    assert [(line["type"], line.get("title") or line.get("content")) for line in lines] == [
+        ("chat", "Chat 0"), ("message", "message 0.0"), ("message", "message 0.1"), ("message", "message 0.2"),
+        ("chat", "Chat 1"),
+        ("chat", "Chat 2"), ("message", "message 2.0"), ("message", "message 2.1"), ("message", "message 2.2"),
+    ]
+
+    async with sessions() as db:
+        other = models.User(email="other@example.com", password="not a hash")
+        db.add(other)
+        await db.commit()
+    other_auth = {"Authorization": f"Bearer {create_access_token(token_claims(other))}"}
+    response = await client.post("/import", headers=other_auth, content=exported)
+    assert response.json() == {"chats": 3, "messages": 6}
+
+    reexported = (await client.get("/export", headers=other_auth, params=params)).content
+    assert without_ids(export_text(reexported, compression)) == without_ids(export_text(exported, compression))
+
+
+def export_text(body: bytes, compression: str | None) -> str:
+    if compression == "zstd":
+        body = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return body.decode()
+
+
+def without_ids(text: str) -> list[dict]:
+    return [{k: v for k, v in json.loads(line).items() if k not in ("id", "chat_id")}
+            for line in text.splitlines()]
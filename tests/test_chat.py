@@ -0,0 +1,79 @@
+import json
+import pytest
+from langchain_core.messages import AIMessageChunk
+from sqlalchemy import select
+from app import models
+from app.config import settings
+from app.llm import registry
+
+pytestmark = pytest.mark.anyio
+
+
+class FailingStream:
+    """Streams `contents`, then fails the way a dropped upstream connection does."""
+
+    def __init__(self, contents):
+        self.contents = contents
+
+    async def astream(self, messages, **kwargs):
+        for content in self.contents:
+            yield AIMessageChunk(content=content)
+        raise ConnectionError("upstream closed the stream")
+
+
+def events(body: str) -> list[tuple[str, dict]]:
+    parsed = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        parsed.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return parsed
+
+
+@pytest.fixture
+async def chat(sessions, user, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path / "indexes"))
+    async with sessions() as db:
+        chat = models.Chat(user_id=user.id)
+        db.add(chat)
+        await db.commit()
+    return chat
+
+
+async def assistant_messages(sessions, chat):
+    async with sessions() as db:
+        return (await db.execute(select(models.Message.id, models.Message.content).where(
+            models.Message.chat_id == chat.id, models.Message.sender == "assistant"))).all()
+
+
+async def test_send_streams_deltas_then_done(client, auth, sessions, chat, replies):
+    replies.append("Hello there")
+    response = await client.post(f"/send/{chat.id}", params={"stream": 1}, headers=auth,
+                                 json={"message": "hi"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    *deltas, done = events(response.text)
+    assert deltas == [("message", {"delta": "Hello"}), ("message", {"delta": " "}),
+                      ("message", {"delta": "there"})]
+    [(message_id, content)] = await assistant_messages(sessions, chat)
+    assert done == ("done", {"reply": "Hello there", "message_id": message_id, "chat_id": chat.id})
+    assert content == "Hello there"
+
+
+@pytest.mark.parametrize("contents", [[], ["Hel", "lo"]])
+async def test_failed_stream_ends_with_error_not_done(client, auth, sessions, chat, replies,
+                                                      monkeypatch, contents):
+    monkeypatch.setattr(registry, "_build", lambda provider, model: FailingStream(contents))
+    response = await client.post(f"/send/{chat.id}", params={"stream": 1}, headers=auth,
+                                 json={"message": "hi"})
+
+    *deltas, (event, data) = events(response.text)
+    assert [data["delta"] for _, data in deltas] == contents
+    assert event == "error" and data["detail"] == "upstream closed the stream"
+
+    # Only a partial reply the client already saw is kept
+    saved = await assistant_messages(sessions, chat)
+    if contents:
+        assert saved == [(data["message_id"], "Hello")]
+    else:
+        assert saved == [] and data["message_id"] is None
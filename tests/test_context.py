@@ -0,0 +1,130 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from sqlalchemy import select
+from app import models
+from app.config import settings
+from app.context import build_context, count_tokens
+
+pytestmark = pytest.mark.anyio
+
+NEW = "What next?"
+# Messages of one size, so budgets can be counted in messages
+TEXT = "a message of a known length"
+
+
+class RecordingLLM:
+    """Answers summary prompts with "summary 1", "summary 2", ... and keeps the prompts."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, messages, **kwargs):
+        self.prompts.append(messages[-1].content)
+        return AIMessage(f"summary {len(self.prompts)}")
+
+
+@pytest.fixture
+async def chat(sessions, user):
+    async with sessions() as db:
+        chat = models.Chat(user_id=user.id, title="Long")
+        db.add(chat)
+        await db.commit()
+    return chat
+
+
+async def add_messages(sessions, chat, n):
+    async with sessions() as db:
+        messages = [models.Message(chat_id=chat.id, sender="user" if i % 2 == 0 else "assistant",
+                                   content=f"{TEXT} {i % 10}") for i in range(n)]
+        db.add_all(messages)
+        await db.commit()
+    return [msg.id for msg in messages]
+
+
+async def context(sessions, chat, llm):
+    async with sessions() as db:
+        chat = await db.merge(chat)
+        history, window = await build_context(db, chat, NEW, llm)
+        await db.commit()
+    return chat, history, [msg.id for msg in window]
+
+
+def fits(messages: int, summary: str | None = None) -> int:
+    """A context_max_tokens that holds exactly `messages` messages besides NEW and `summary`."""
+    return (count_tokens(NEW) + messages * count_tokens(f"{TEXT} 0")
+            + (count_tokens(summary) if summary else 0))
+
+
+@pytest.mark.parametrize("slack, sent", [(0, 3), (-1, 2)])
+async def test_window_holds_the_newest_messages_that_fit(sessions, chat, monkeypatch, slack, sent):
+    ids = await add_messages(sessions, chat, 5)
+    monkeypatch.setattr(settings, "context_max_tokens", fits(3) + slack)
+    llm = RecordingLLM()
+
+    chat, history, window = await context(sessions, chat, llm)
+    assert window == ids[-sent:]
+    assert history[0] == SystemMessage("Summary of the earlier conversation:\nsummary 1")
+    assert [msg.content for msg in history[1:-1]] == [f"{TEXT} {i}" for i in range(5 - sent, 5)]
+    assert isinstance(history[1], HumanMessage if (5 - sent) % 2 == 0 else AIMessage)
+    assert history[-1] == HumanMessage(NEW)
+
+    # Everything older than the window went into the summary in one call
+    assert len(llm.prompts) == 1
+    assert chat.summary == "summary 1" and chat.summary_message_id == ids[-sent - 1]
+
+
+async def test_short_chat_is_sent_without_a_summary(sessions, chat, monkeypatch):
+    ids = await add_messages(sessions, chat, 3)
+    monkeypatch.setattr(settings, "context_max_tokens", fits(3))
+    llm = RecordingLLM()
+
+    chat, history, window = await context(sessions, chat, llm)
+    assert window == ids and len(history) == 4
+    assert llm.prompts == [] and chat.summary is None
+
+
+async def test_summary_is_updated_with_only_the_new_overflow(sessions, chat, monkeypatch):
+    ids = await add_messages(sessions, chat, 4)
+    monkeypatch.setattr(settings, "context_max_tokens", fits(2, "summary 1"))
+    llm = RecordingLLM()
+
+    chat, _, window = await context(sessions, chat, llm)
+    assert window == ids[2:]
+    assert llm.prompts[0].startswith("Current summary:\n(none)")
+    assert f"user: {TEXT} 0\nassistant: {TEXT} 1" in llm.prompts[0]
+    assert chat.summary_message_id == ids[1]
+
+    # The next turn pushes two more messages out; only they are summarized,
+    # on top of the summary so far
+    ids += await add_messages(sessions, chat, 2)
+    chat, history, window = await context(sessions, chat, llm)
+    assert window == ids[4:]
+    assert llm.prompts[1].startswith("Current summary:\nsummary 1\n")
+    assert llm.prompts[1].endswith(f"New turns:\nuser: {TEXT} 2\nassistant: {TEXT} 3")
+    assert chat.summary == "summary 2" and chat.summary_message_id == ids[3]
+    assert history[0].content.endswith("summary 2")
+
+    # Nothing new overflowed, so no summary call
+    await context(sessions, chat, llm)
+    assert len(llm.prompts) == 2
+
+
+async def test_long_backlog_is_folded_a_few_batches_per_turn(sessions, chat, monkeypatch):
+    ids = await add_messages(sessions, chat, 12)
+    # Two messages per summary batch, and the window holds two
+    monkeypatch.setattr(settings, "context_max_tokens", fits(2))
+    monkeypatch.setattr(settings, "context_summary_batches_per_turn", 2)
+    llm = RecordingLLM()
+
+    chat, history, window = await context(sessions, chat, llm)
+    assert len(llm.prompts) == 2
+    assert chat.summary_message_id == ids[3]
+    # The backlog between the summary and the window waits for later turns
+    assert window == ids[-2:] and len(history) == 4
+
+    chat, _, _ = await context(sessions, chat, llm)
+    assert len(llm.prompts) == 4
+    assert f"{TEXT} 4" in llm.prompts[2]
+    assert chat.summary_message_id > ids[3]
+    async with sessions() as db:
+        assert (await db.scalar(select(models.Chat.summary).where(models.Chat.id == chat.id))) == "summary 4"
@@ -0,0 +1,15 @@
+import pytest
+from app.ingest import extract_text
+
+
+@pytest.mark.parametrize("data, text", [
+    ("héllo".encode("utf-8"), "héllo"),
+    ("héllo".encode("utf-8-sig"), "héllo"),
+    ("héllo".encode("utf-16"), "héllo"),
+    ("héllo".encode("latin-1"), "héllo"),
+    (b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR", None),
+])
+def test_extract_text(tmp_path, data, text):
+    path = tmp_path / "upload"
+    path.write_bytes(data)
+    assert extract_text(str(path)) == text
@@ -0,0 +1,26 @@
+import pytest
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from app.metrics import LLM_FIRST_TOKEN_SECONDS, InstrumentedLLM
+
+
+class ScriptedStream:
+    def __init__(self, contents):
+        self.contents = contents
+
+    async def astream(self, messages, **kwargs):
+        for content in self.contents:
+            yield AIMessageChunk(content=content)
+
+
+def samples(model: str) -> int:
+    entry = LLM_FIRST_TOKEN_SECONDS._values.get((model,))
+    return entry[2] if entry else 0
+
+
+@pytest.mark.anyio
+async def test_time_to_first_token_after_empty_first_chunk():
+    # Like OpenAI's stream, which opens with a role-only delta
+    llm = InstrumentedLLM(ScriptedStream(["", "Hello", " there"]), "scripted")
+    chunks = [chunk.content async for chunk in llm.astream([HumanMessage("hi")])]
+    assert chunks == ["", "Hello", " there"]
+    assert samples("scripted") == 1
@@ -0,0 +1,36 @@
+import datetime
+import pytest
+from app import models
+from app.pagination import encode_cursor
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_chat_pages(client, auth, sessions, user):
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    async with sessions() as db:
+        db.add_all(models.Chat(user_id=user.id, title=f"Chat {i}", updated_at=start + datetime.timedelta(minutes=i))
+                   for i in range(5))
+        await db.commit()
+
+    titles, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = (await client.get("/chats", headers=auth, params=params)).json()
+        titles += [chat["title"] for chat in page["items"]]
+        if not (cursor := page["next_cursor"]):
+            break
+    assert titles == [f"Chat {i}" for i in reversed(range(5))]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    encode_cursor("2024-01-01T00:00:00"),
+    encode_cursor(1, 2),
+    encode_cursor("yesterday", 2),
+    encode_cursor("2024-01-01T00:00:00", "2"),
+    encode_cursor("2024-01-01T00:00:00", 2, 3),
+])
+async def test_invalid_chat_cursor(client, auth, cursor):
+    response = await client.get("/chats", headers=auth, params={"cursor": cursor})
+    assert response.status_code == 400
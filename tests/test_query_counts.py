@@ -0,0 +1,46 @@
+"""Read endpoints run a fixed number of queries, however much data they return."""
+import pytest
+from app import models
+from app.queries import count_queries
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def chats(sessions, user):
+    async with sessions() as db:
+        chats = [models.Chat(user_id=user.id, title=f"Chat {i}") for i in range(3)]
+        db.add_all(chats)
+        await db.flush()
+        db.add_all(models.Message(chat_id=chat.id, sender=sender, content=f"{sender} message {i}")
+                   for chat in chats for i in range(5) for sender in ("user", "assistant"))
+        await db.commit()
+    return chats
+
+
+async def statements_for(client, engine, auth, url: str) -> list[str]:
+    # Once to load the user into the principal cache, so only the endpoint's own queries count
+    assert (await client.get(url, headers=auth)).status_code == 200
+    with count_queries(engine) as statements:
+        response = await client.get(url, headers=auth)
+    assert response.status_code == 200
+    return statements
+
+
+async def test_list_chats(client, engine, auth, chats):
+    assert len(await statements_for(client, engine, auth, "/chats")) == 1
+
+
+async def test_chat_detail(client, engine, auth, chats):
+    # The chat, then its messages in one selectin load
+    assert len(await statements_for(client, engine, auth, f"/chats/{chats[0].id}")) == 2
+
+
+async def test_chat_messages(client, engine, auth, chats):
+    # The ownership check, then one page of messages
+    assert len(await statements_for(client, engine, auth, f"/chats/{chats[0].id}/messages")) == 2
+
+
+async def test_current_user(client, engine, auth, chats):
+    # The user, then their chats in one selectin load
+    assert len(await statements_for(client, engine, auth, "/users/me")) == 2
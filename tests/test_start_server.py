@@ -0,0 +1,21 @@
+from app import start_server
+from app.config import settings
+
+
+def test_default_workers_fit_the_connection_budget(monkeypatch):
+    monkeypatch.setattr(start_server, "available_cpus", lambda: 8)
+    monkeypatch.setattr(settings, "server_workers", 0)
+    monkeypatch.setattr(settings, "database_pool_size", 10)
+    monkeypatch.setattr(settings, "database_max_overflow", 10)
+    monkeypatch.setattr(settings, "database_max_connections", 100)
+    assert start_server.worker_count() == 5
+
+    monkeypatch.setattr(start_server, "available_cpus", lambda: 2)
+    assert start_server.worker_count() == 2
+
+
+def test_explicit_workers_over_budget_warn(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "server_workers", 8)
+    monkeypatch.setattr(settings, "database_max_connections", 100)
+    assert start_server.worker_count() == 8
+    assert "DATABASE_MAX_CONNECTIONS" in caplog.text
@@ -0,0 +1,91 @@
+import datetime
+import pytest
+from sqlalchemy import insert, select
+from app import models
+from app.stats import reconcile
+
+pytestmark = pytest.mark.anyio
+
+EARLIER = datetime.datetime(2024, 1, 1, 12, 0)
+LATER = datetime.datetime(2024, 1, 2, 12, 0)
+
+
+def at(value):
+    # SQLite hands timestamps back without a zone
+    return value.replace(tzinfo=None) if value else None
+
+
+async def counters(sessions, user_id):
+    async with sessions() as db:
+        user = await db.get(models.User, user_id)
+        chats = (await db.scalars(select(models.Chat).where(models.Chat.user_id == user_id)
+                                  .order_by(models.Chat.id))).all()
+    return ((user.chat_count, user.message_count, at(user.last_message_at)),
+            [(chat.message_count, at(chat.last_message_at)) for chat in chats])
+
+
+async def add_chat(sessions, user, *created_at):
+    async with sessions() as db:
+        chat = models.Chat(user_id=user.id, title="Counted")
+        db.add(chat)
+        await db.flush()
+        db.add_all(models.Message(chat_id=chat.id, sender="user", content=f"message {i}", created_at=when)
+                   for i, when in enumerate(created_at))
+        await db.commit()
+    return chat.id
+
+
+async def test_message_insert_and_delete_update_counters(sessions, user):
+    chat_id = await add_chat(sessions, user, EARLIER, LATER)
+    (chat_count, message_count, last), [(chat_messages, chat_last)] = await counters(sessions, user.id)
+    assert (chat_count, message_count, chat_messages) == (1, 2, 2)
+    assert last is not None and chat_last == last
+
+    # Removing the newest message moves last_message_at back to the one before it
+    async with sessions() as db:
+        newest = await db.scalar(select(models.Message).where(models.Message.created_at == LATER))
+        await db.delete(newest)
+        await db.commit()
+    assert await counters(sessions, user.id) == ((1, 1, EARLIER), [(1, EARLIER)])
+
+    async with sessions() as db:
+        db.add(models.Message(chat_id=chat_id, sender="assistant", content="again"))
+        await db.commit()
+    (_, message_count, last), [(chat_messages, chat_last)] = await counters(sessions, user.id)
+    assert (message_count, chat_messages) == (2, 2)
+    assert chat_last == last and last > EARLIER
+
+
+async def test_deleting_a_chat_updates_user_counters(client, auth, sessions, user):
+    kept = await add_chat(sessions, user, EARLIER)
+    deleted = await add_chat(sessions, user, EARLIER, LATER)
+    async with sessions() as db:
+        await reconcile(db, user.id)
+        await db.commit()
+    assert await counters(sessions, user.id) == ((2, 3, LATER), [(1, EARLIER), (2, LATER)])
+
+    response = await client.delete(f"/chats/{deleted}", headers=auth)
+    assert response.status_code == 204
+    assert await counters(sessions, user.id) == ((1, 1, EARLIER), [(1, EARLIER)])
+    async with sessions() as db:
+        assert await db.get(models.Chat, kept) is not None
+
+
+async def test_reconcile_repairs_core_inserts(sessions, user):
+    await add_chat(sessions, user, EARLIER)
+    async with sessions() as db:
+        # The same Core inserts /import uses, which skip the ORM counter hooks
+        chat_id = await db.scalar(insert(models.Chat).values(user_id=user.id, title="Imported")
+                                  .returning(models.Chat.id))
+        await db.execute(insert(models.Message).values([
+            {"chat_id": chat_id, "sender": "user", "content": "one", "created_at": EARLIER},
+            {"chat_id": chat_id, "sender": "assistant", "content": "two", "created_at": LATER},
+        ]))
+        await db.commit()
+    (chat_count, message_count, _), [_, imported] = await counters(sessions, user.id)
+    assert (chat_count, message_count, imported) == (1, 1, (0, None))
+
+    async with sessions() as db:
+        await reconcile(db, user.id)
+        await db.commit()
+    assert await counters(sessions, user.id) == ((2, 3, LATER), [(1, EARLIER), (2, LATER)])
@@ -0,0 +1,82 @@
+import os
+import pytest
+from app import models, vectorstore
+from app.config import settings
+from app.storage import parse_file_tag
+
+
+def test_parse_file_tag():
+    path = os.path.join(settings.upload_dir, "ab", "ab" * 32)
+    assert parse_file_tag(f"[file:{path}|notes.txt]") == (path, "notes.txt")
+    assert parse_file_tag("just a message") is None
+
+
+@pytest.mark.parametrize("path", [
+    "/etc/passwd",
+    os.path.join(settings.upload_dir, "..", "app", "main.py"),
+    os.path.join(settings.upload_dir, "index", "1.npz"),
+    os.path.join(settings.upload_dir, "tmp", "ab" * 16),
+    os.path.join(settings.upload_dir, "cd", "ab" * 32),
+    os.path.join(settings.upload_dir, "ab", "AB" * 32),
+])
+def test_parse_file_tag_rejects_non_blobs(path):
+    assert parse_file_tag(f"[file:{path}|x]") is None
+
+
+@pytest.mark.anyio
+async def test_files_does_not_serve_other_chats_indexes(client, auth, sessions, user, replies,
+                                                       tmp_path, monkeypatch):
+    # The layout that leaked: indexes stored under upload_dir
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path / "index"))
+    async with sessions() as db:
+        victim = models.User(email="victim@example.com", password="not a hash")
+        db.add(victim)
+        await db.flush()
+        victim_chat = models.Chat(user_id=victim.id)
+        own_chat = models.Chat(user_id=user.id)
+        db.add_all([victim_chat, own_chat])
+        await db.commit()
+    await vectorstore.add(victim_chat.id, [[1.0, 0.0]], ["the victim's upload"], source="x")
+
+    replies.append("ok")
+    tag = f"[file:{vectorstore.index_path(victim_chat.id)}|x]"
+    assert (await client.post(f"/send/{own_chat.id}", headers=auth, json={"message": tag})).status_code == 200
+
+    messages = (await client.get(f"/chats/{own_chat.id}/messages", headers=auth)).json()["items"]
+    [forged] = [m for m in messages if m["content"] == tag]
+    assert (await client.get(f"/files/{forged['id']}", headers=auth)).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_upload_too_large(client, auth, monkeypatch):
+    monkeypatch.setattr(settings, "upload_max_bytes", 1024)
+    response = await client.post("/upload/1", headers=auth,
+                                 files={"file": ("big.txt", b"x" * 200_000)})
+    assert response.status_code == 413
+
+
+@pytest.mark.anyio
+async def test_chunked_upload_too_large(client, auth, sessions, user, monkeypatch):
+    monkeypatch.setattr(settings, "upload_max_bytes", 1024)
+    async with sessions() as db:
+        chat = models.Chat(user_id=user.id)
+        db.add(chat)
+        await db.commit()
+    sent = []
+
+    async def body():
+        # A multipart body with no Content-Length, as a chunked upload sends it
+        yield (b'--b\r\nContent-Disposition: form-data; name="file"; filename="big.txt"\r\n'
+               b'Content-Type: text/plain\r\n\r\n')
+        for _ in range(100):
+            sent.append(4096)
+            yield b"x" * 4096
+        yield b"\r\n--b--\r\n"
+
+    response = await client.post(f"/upload/{chat.id}", content=body(),
+                                 headers={**auth, "Content-Type": "multipart/form-data; boundary=b"})
+    assert "content-length" not in response.request.headers
+    assert response.status_code == 413
+    # Reading stopped at the limit instead of spooling the whole body
+    assert sum(sent) < 100 * 4096
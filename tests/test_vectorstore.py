@@ -0,0 +1,40 @@
+import asyncio
+import multiprocessing
+import os
+import pytest
+from app import vectorstore
+from app.config import settings
+
+
+def add_sources(chat_id: int, sources: list[str]):
+    async def add_all():
+        for source in sources:
+            await vectorstore.add(chat_id, [[1.0, 0.0, 0.0]], [f"chunk of {source}"], source=source)
+    asyncio.run(add_all())
+
+
+def test_concurrent_writers_keep_every_update(tmp_path, monkeypatch):
+    # Workers are forked processes, each with its own in-process lock
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=add_sources, args=(1, [f"w{w}-{i}" for i in range(10)]))
+               for w in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    index, _ = vectorstore._read(vectorstore.index_path(1))
+    assert sorted(index.sources) == sorted(f"w{w}-{i}" for w in range(4) for i in range(10))
+    assert sorted(os.listdir(tmp_path)) == ["1.npz", "1.npz.lock"]
+
+
+@pytest.mark.anyio
+async def test_add_skips_indexed_source(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "index_dir", str(tmp_path))
+    assert await vectorstore.add(2, [[1.0, 0.0]], ["a"], source="s")
+    assert not await vectorstore.add(2, [[0.0, 1.0]], ["b"], source="s")
+    assert len(await vectorstore.load(2)) == 1
+    await vectorstore.drop(2)
+    assert os.listdir(tmp_path) == []
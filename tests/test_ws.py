@@ -0,0 +1,65 @@
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+from fastapi import status
+from app.oauth2 import create_access_token, token_claims
+from app.routers.ws import chat_socket
+
+pytestmark = pytest.mark.anyio
+
+
+class ScriptedWebSocket:
+    """Plays `messages` to the handler, then disconnects once `replies` frames were sent."""
+
+    def __init__(self, messages: list[dict], replies: int = 0):
+        self.messages = list(messages)
+        self.replies = replies
+        self.query_params = {}
+        self.client_state = SimpleNamespace(name="CONNECTED")
+        self.sent = []
+        self.close_code = None
+        self._sent_enough = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def receive(self):
+        if self.messages:
+            return self.messages.pop(0)
+        if self.replies:
+            await self._sent_enough.wait()
+        self.client_state.name = "DISCONNECTED"
+        return {"type": "websocket.disconnect", "code": 1000}
+
+    async def send_json(self, frame):
+        self.sent.append(frame)
+        if len(self.sent) >= self.replies:
+            self._sent_enough.set()
+
+    async def close(self, code: int = 1000, reason: str | None = None):
+        self.close_code = code
+        self.client_state.name = "DISCONNECTED"
+
+
+def text(frame: dict) -> dict:
+    return {"type": "websocket.receive", "text": json.dumps(frame)}
+
+
+async def test_bad_frames_keep_the_connection(sessions, user):
+    websocket = ScriptedWebSocket([
+        text({"type": "auth", "token": create_access_token(token_claims(user))}),
+        {"type": "websocket.receive", "text": "not json"},
+        {"type": "websocket.receive", "bytes": b"\x00\x01"},
+        text({"type": "ping"}),
+    ], replies=3)
+    await chat_socket(websocket)
+
+    error = {"type": "error", "id": None, "status": 400, "detail": "Frames must be JSON objects"}
+    assert websocket.sent == [error, error, {"type": "pong"}]
+
+
+async def test_auth_frame_required(sessions):
+    websocket = ScriptedWebSocket([text({"type": "auth", "token": "not a token"})])
+    await chat_socket(websocket)
+    assert websocket.close_code == status.WS_1008_POLICY_VIOLATION